@@ -1,18 +1,98 @@
 import os
+import argparse
+import threading
 import pandas as pd
 import json
-from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from sqlalchemy import insert
 from sqlalchemy import text
 
 from agentic_system.db.db_conn import engine, session_scope
-from agentic_system.db.db_schemas import Base, Product, ProductCooccurrences
-from agentic_system.utils.utils import generate_embeddings
+from agentic_system.db.db_schemas import Base
+from agentic_system.db.catalog_version import install_version_triggers
+from agentic_system.db.catalog_loader import (
+    text_hash, needs_embedding, reuse_stored_embeddings, ensure_product_key,
+    ensure_cooccurrence_scores, upsert_products, upsert_cooccurrences, refresh_derived,
+)
+from agentic_system.db.cooccurrence_builder import normalize_pairs
+from agentic_system.utils.utils import generate_embeddings_batch
+from agentic_system.utils.embedding_store import EmbeddingStore
 
 
 load_dotenv()
 
+# number of texts sent per embedding request
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", 256))
+# number of embedding requests running in parallel (spaced out by the shared OPENAI_RPM_LIMIT/OPENAI_TPM_LIMIT scheduler)
+EMBEDDING_CONCURRENCY = int(os.environ.get("EMBEDDING_CONCURRENCY", 4))
+
+# keys of the embeddings stored inline by older versions of the products json
+INLINE_EMBEDDING_KEYS = ("embedding", "tokens", "text_hash")
+
+
+def embed_products(product_data: list[dict], checkpoint_path: str):
+    """Adds `tokens` and `embedding` to every product without one or whose text changed.
+
+    Texts are embedded in batches by several parallel requests under the shared OpenAI rate limits. Every finished
+    batch is appended to a checkpoint file, so a rerun after a crash only embeds what is missing.
+    """
+    # restore embeddings computed by a previous (interrupted) run
+    checkpoint = {}
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # partially written last line
+                checkpoint[record["text_hash"]] = record
+
+    pending = []
+    for product in product_data:
+        if not needs_embedding(product):
+            # from now on, edits of the text are detected
+            product.setdefault("text_hash", text_hash(product['text']))
+            continue
+        record = checkpoint.get(text_hash(product['text']))
+        if record is not None:
+            product["tokens"], product["embedding"] = record["tokens"], record["embedding"]
+            product["text_hash"] = record["text_hash"]
+        else:
+            pending.append(product)
+
+    print(f'{len(product_data) - len(pending)} products already embedded, {len(pending)} to embed')
+    if not pending:
+        return
+
+    batches = [pending[i:i + EMBEDDING_BATCH_SIZE] for i in range(0, len(pending), EMBEDDING_BATCH_SIZE)]
+    checkpoint_lock = threading.Lock()
+
+    def embed_batch(batch):
+        # catalog texts stay out of the query-embedding cache, the checkpoint and the store keep them
+        results = generate_embeddings_batch([product['text'] for product in batch], use_cache=False)
+
+        with checkpoint_lock, open(checkpoint_path, 'a', encoding='utf-8') as f:
+            for product, (tokens, embedding) in zip(batch, results):
+                product["tokens"], product["embedding"] = tokens, embedding
+                product["text_hash"] = text_hash(product['text'])
+                f.write(json.dumps({"text_hash": text_hash(product['text']), "tokens": tokens, "embedding": embedding}) + "\n")
+        return len(batch)
+
+    done = 0
+    with ThreadPoolExecutor(max_workers=EMBEDDING_CONCURRENCY) as executor:
+        for n in executor.map(embed_batch, batches):
+            done += n
+            print(f'Embedded {done}/{len(pending)} products')
+
+#-- Command line: by default the files in 01_clean_data are the full catalog
+parser = argparse.ArgumentParser(description="Load (or incrementally update) the product catalog in PostgreSQL")
+parser.add_argument("--products", default=os.path.join(os.getcwd(), "01_clean_data", "products_data.json"))
+parser.add_argument("--cooccurrences", default=os.path.join(os.getcwd(), "01_clean_data", "coocurrences_data.csv"))
+parser.add_argument("--embeddings", default=None, help="Embedding store directory (default: 'embeddings' next to the products file)")
+parser.add_argument("--delta", action="store_true", help="Files only hold new/changed rows, do not delete missing ones")
+parser.add_argument("--reindex", action="store_true", help="Rebuild the vector index even if it is up to date")
+args = parser.parse_args()
+
 #-- Create dbo schemma and pgvector extension if not yet created
 with engine.connect() as conn:
     conn.execute(text("CREATE SCHEMA IF NOT EXISTS dbo"))
@@ -22,47 +102,97 @@ with engine.connect() as conn:
 #-- Create all tables
 Base.metadata.create_all(engine)
 
+#-- Bump dbo.catalog_versions on every write, in-process caches reload from it
+with engine.begin() as conn:
+    install_version_triggers(conn)
+
+
+#---------------------------
+#-- Product embeddings
+#---------------------------
+# computed before opening the loading transaction, progress is checkpointed to disk
+products_path = args.products
+with open(products_path, 'r') as file:
+    product_data = json.load(file)
+
+# the json only holds metadata, embeddings live in a binary sidecar (one matrix per embedding model)
+embeddings_dir = args.embeddings or os.path.join(os.path.dirname(os.path.abspath(products_path)), "embeddings")
+embedding_store = EmbeddingStore(embeddings_dir, os.environ["OPENAI_EMB_MODEL"]).load()
+
+# older json files hold the embeddings inline, they are moved to the store below
+inline_embeddings = any("embedding" in product for product in product_data)
+metadata = [{k: v for k, v in product.items() if k not in INLINE_EMBEDDING_KEYS} for product in product_data]
+
+for product in product_data:
+    # raw data uses "Store A" style keys, map them to the table columns
+    for store in ("A", "B", "C"):
+        if f"Store {store}" in product:
+            product[f"store_{store.lower()}"] = product.pop(f"Store {store}")
+
+    # memory-mapped row, only valid if computed from the current text
+    if "embedding" not in product:
+        stored = embedding_store.get(product["name"], text_hash(product["text"]))
+        if stored is not None:
+            product["tokens"], product["embedding"] = stored
+            product["text_hash"] = text_hash(product["text"])
+
+# products already in the database with the same text keep their embedding
+with session_scope() as session:
+    reused = reuse_stored_embeddings(session, product_data)
+print(f'{reused} embeddings reused from the database')
+
+# create embeddings from openai embedding model for new products and changed texts only
+print('Creating product embeddings')
+checkpoint_path = os.path.splitext(products_path)[0] + ".checkpoint.jsonl"
+embed_products(product_data, checkpoint_path)
 
-#-- Insert data
-data_dir = os.path.join(os.getcwd(), "01_clean_data")
+# save the store (delta files only replace their own products), only if anything changed
+entries = embedding_store.entries() if args.delta else {}
+entries.update({p["name"]: (p["text_hash"], p["tokens"], p["embedding"]) for p in product_data})
+if [(name, h, t) for name, (h, t, _) in entries.items()] != [(k["name"], k["text_hash"], k["tokens"]) for k in embedding_store.keys]:
+    print(f'Saving {len(entries)} embeddings to {embedding_store.matrix_path}')
+    embedding_store.save(entries)
+
+# metadata only json, written once when migrating inline embeddings to the store
+if inline_embeddings:
+    with open(products_path, 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=4)
+
+# all embeddings are persisted in the store, checkpoint no longer needed
+if os.path.exists(checkpoint_path):
+    os.remove(checkpoint_path)
 
 
 with session_scope() as session:
+    ensure_product_key(session)
+    ensure_cooccurrence_scores(session)
+
+    #---------------------------
+    #-- Product data
+    #---------------------------
+    print('Upserting product data')
+    changed_products = set()
+    product_stats = upsert_products(session, product_data, delete_missing=not args.delta, changed_names=changed_products)
+    print(f'Products: {product_stats}')
+
     #---------------------------        
     #-- Co-ocurrences data 
     #---------------------------
-    coocur_df = pd.read_csv(os.path.join(data_dir, "coocurrences_data.csv"))
+    # files written by 02_build_cooccurrences.py --lift also carry lift/pmi (read back exactly)
+    coocur_df = pd.read_csv(args.cooccurrences, float_precision='round_trip')
 
     # ensure product1 and product2 order to avoid inverse duplicates
-    coocur_df[['product1', 'product2']] = coocur_df[['product1', 'product2']].apply(lambda x: sorted(x), axis=1, result_type='expand')
+    coocur_df = normalize_pairs(coocur_df)
 
     # drop duplicate product pairs (now normalized)
     coocur_df = coocur_df.drop_duplicates(subset=['product1', 'product2'])
 
-    print('Ingesting product co-ocurrences data')
-    session.execute(
-        insert(ProductCooccurrences),
-        coocur_df.to_dict(orient='records')
-    )
+    print('Upserting product co-ocurrences data')
+    cooccurrence_stats = upsert_cooccurrences(session, coocur_df, delete_missing=not args.delta, changed_names=changed_products)
+    print(f'Co-occurrences: {cooccurrence_stats}')
 
     #---------------------------
-    #-- Product data
+    #-- Derived data
     #---------------------------
-    with open(os.path.join(data_dir, "products_data.json"), 'r') as file:
-        product_data = json.load(file)
-
-    # create embeddings from openai embedding model if json does not have it yet
-    print('Creating product embeddings')
-    for product in product_data:
-        if "embedding" not in product.keys():
-            product["tokens"], product["embedding"] = generate_embeddings(text=product['text'])
-
-    # save json with embeddings        
-    with open(os.path.join(data_dir, "products_data.json"), 'w', encoding='utf-8') as f:
-        json.dump(product_data, f, ensure_ascii=False, indent=4)
-
-    print('Insert product data')
-    session.execute(
-        insert(Product),
-        product_data
-    )
+    # co-occurrence neighbours (ID-based, top-k per product), vector index and similar products, only when needed
+    refresh_derived(session, product_stats, cooccurrence_stats, reindex=args.reindex, changed_products=changed_products)
@@ -0,0 +1,51 @@
+import argparse
+from dotenv import load_dotenv
+
+from agentic_system.db.db_conn import session_scope
+from agentic_system.db.catalog_loader import (
+    ensure_cooccurrence_scores, upsert_cooccurrences, refresh_derived,
+)
+from agentic_system.db.cooccurrence_builder import (
+    CooccurrenceCounter, BASKET_CHUNK_ROWS, BASKET_MAX_PRODUCTS,
+)
+
+
+load_dotenv()
+
+#-- Command line: raw order lines, one row per (order, product), grouped by order
+parser = argparse.ArgumentParser(description="Recompute dbo.cooccurrences from raw basket/order line data")
+parser.add_argument("--baskets", required=True, help="CSV file with one row per order line")
+parser.add_argument("--order-column", default="order_id")
+parser.add_argument("--product-column", default="product", help="Column holding the product name")
+parser.add_argument("--chunk-rows", type=int, default=BASKET_CHUNK_ROWS, help="Order lines read per chunk")
+parser.add_argument("--max-basket-products", type=int, default=BASKET_MAX_PRODUCTS, help="Larger baskets are skipped")
+parser.add_argument("--min-count", type=int, default=1, help="Drop pairs seen in fewer baskets")
+parser.add_argument("--lift", action="store_true", help="Also compute lift and PMI of every pair")
+parser.add_argument("--delta", action="store_true", help="Only upsert the computed pairs, do not delete the other ones")
+parser.add_argument("--output", default=None, help="Also write the pairs to this CSV (01_insert_data.py format)")
+args = parser.parse_args()
+
+#---------------------------
+#-- Count pairs
+#---------------------------
+counter = CooccurrenceCounter(max_basket_products=args.max_basket_products)
+counter.add_csv(args.baskets, order_column=args.order_column, product_column=args.product_column, chunk_rows=args.chunk_rows)
+cooccurrences = counter.result(min_count=args.min_count, with_lift=args.lift)
+print(f'{counter.n_baskets} baskets ({counter.skipped_baskets} skipped), {len(counter.products)} products, {len(cooccurrences)} pairs')
+
+if args.output:
+    cooccurrences.to_csv(args.output, index=False)
+
+#---------------------------
+#-- Write dbo.cooccurrences
+#---------------------------
+with session_scope() as session:
+    ensure_cooccurrence_scores(session)
+
+    print('Upserting product co-ocurrences data')
+    changed_products = set()
+    cooccurrence_stats = upsert_cooccurrences(session, cooccurrences, delete_missing=not args.delta, changed_names=changed_products)
+    print(f'Co-occurrences: {cooccurrence_stats}')
+
+    # co-occurrence neighbours and the similar products of the affected products, only when pairs changed
+    refresh_derived(session, {"inserted": 0, "updated": 0, "deleted": 0}, cooccurrence_stats, changed_products=changed_products)
@@ -0,0 +1,135 @@
+import os
+import re
+import threading
+import numpy as np
+from dotenv import load_dotenv
+
+from agentic_system.db.product_search import NumpySearchBackend, get_search_backend
+from agentic_system.utils.utils import generate_embeddings
+from agentic_system.utils.tracing import debug_print
+
+load_dotenv()
+
+# the pre-router is optional, the LLM supervisor always remains the fallback
+PRE_ROUTER_ENABLED = os.environ.get("PRE_ROUTER_ENABLED", "false").lower() in ("1", "true", "yes")
+# similarity (inner product of normalized embeddings) to the closest catalog product
+PRE_ROUTER_IN_SCOPE_SIM = float(os.environ.get("PRE_ROUTER_IN_SCOPE_SIM", 0.35))
+PRE_ROUTER_OUT_OF_SCOPE_SIM = float(os.environ.get("PRE_ROUTER_OUT_OF_SCOPE_SIM", 0.20))
+
+CANNED_REFUSAL = (
+    "I'm sorry, but I can only help with questions about Nintendo Switch products, "
+    "such as consoles, games and accessories. Feel free to ask me for a Nintendo Switch recommendation!"
+)
+
+# generic in-scope vocabulary, completed at load time with words from the catalog itself
+IN_SCOPE_KEYWORDS = {
+    "nintendo", "switch", "game", "games", "console", "consoles", "controller", "controllers", "accessory",
+    "accessories", "joy", "con", "joycon", "dock", "multiplayer", "coop", "co-op", "play", "player", "players",
+    "gaming", "gamer", "recommend", "recommendation", "recommendations", "gift", "store",
+}
+OUT_OF_SCOPE_KEYWORDS = {
+    "pizza", "recipe", "cook", "weather", "stock", "stocks", "crypto", "bitcoin", "politics", "election",
+    "flight", "hotel", "doctor", "medicine", "lawyer", "tax", "taxes", "translate", "poem", "essay",
+    "homework", "playstation", "xbox", "ps5", "ps4",
+}
+STOPWORDS = {"the", "of", "and", "for", "with", "set", "pair", "new"}
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9\-]*")
+
+
+###############################################################################
+# Local pre-router
+###############################################################################
+
+class PreRouter:
+    """Decides clear-cut first hops without calling the LLM supervisor.
+
+    Combines a small keyword model (generic + catalog vocabulary) with the embedding similarity
+    of the user request to the closest catalog product and to the catalog centroid:
+
+    - "out_of_scope": no catalog vocabulary, low similarity and an out-of-scope keyword (or very low similarity).
+    - "querying_node": catalog vocabulary and high similarity, data must be queried first.
+    - None: not confident, the LLM supervisor decides.
+
+    The query embedding goes through the embedding cache, so the following product search reuses it.
+    """
+
+    def __init__(self):
+        # with the numpy search backend, its embedding matrix is shared instead of loaded twice
+        backend = get_search_backend()
+        self.backend = backend if isinstance(backend, NumpySearchBackend) else NumpySearchBackend()
+        self._lock = threading.Lock()
+        self._catalog_rows = None
+        self._vocabulary = set()
+        self._centroid = None
+
+        self.fast_in_scope = 0
+        self.fast_out_of_scope = 0
+        self.fallbacks = 0
+
+    def _catalog(self):
+        matrix, rows, _ = self.backend.snapshot()
+        if rows is not self._catalog_rows:
+            with self._lock:
+                vocabulary = set()
+                for row in rows:
+                    for column in ("name", "type", "category", "franchise", "major_category"):
+                        vocabulary |= set(TOKEN_PATTERN.findall((row[column] or "").lower()))
+                centroid = np.asarray(matrix, dtype=np.float32).mean(axis=0) if len(rows) else None
+                if centroid is not None:
+                    centroid /= np.linalg.norm(centroid)
+                self._vocabulary = (vocabulary - STOPWORDS) | IN_SCOPE_KEYWORDS
+                self._centroid = centroid
+                self._catalog_rows = rows
+        return matrix
+
+    def features(self, user_message: str) -> dict:
+        matrix = self._catalog()
+        tokens = set(TOKEN_PATTERN.findall(user_message.lower()))
+
+        features = {
+            "in_scope_terms": len(tokens & self._vocabulary),
+            "out_of_scope_terms": len(tokens & OUT_OF_SCOPE_KEYWORDS),
+            "max_similarity": 0.0,
+            "centroid_similarity": 0.0,
+        }
+        if len(matrix):
+            _, embedding = generate_embeddings(user_message)
+            query = np.asarray(embedding, dtype=np.float32)
+            features["max_similarity"] = float(np.max(np.asarray(matrix, dtype=np.float32) @ query))
+            features["centroid_similarity"] = float(self._centroid @ query)
+        return features
+
+    def route(self, user_message: str) -> str | None:
+        f = self.features(user_message)
+
+        decision = None
+        if f["in_scope_terms"] == 0 and f["max_similarity"] < PRE_ROUTER_OUT_OF_SCOPE_SIM:
+            decision = "out_of_scope"
+        elif f["in_scope_terms"] == 0 and f["out_of_scope_terms"] > 0 and f["max_similarity"] < PRE_ROUTER_IN_SCOPE_SIM:
+            decision = "out_of_scope"
+        elif f["in_scope_terms"] > 0 and f["out_of_scope_terms"] == 0 and f["max_similarity"] >= PRE_ROUTER_IN_SCOPE_SIM:
+            decision = "querying_node"
+
+        with self._lock:
+            if decision == "out_of_scope":
+                self.fast_out_of_scope += 1
+            elif decision == "querying_node":
+                self.fast_in_scope += 1
+            else:
+                self.fallbacks += 1
+
+        debug_print(f"Pre-router: {decision or 'LLM fallback'} {f}")
+        return decision
+
+    def stats(self) -> dict:
+        total = self.fast_in_scope + self.fast_out_of_scope + self.fallbacks
+        return {
+            "fast_in_scope": self.fast_in_scope,
+            "fast_out_of_scope": self.fast_out_of_scope,
+            "fallbacks": self.fallbacks,
+            "fast_path_rate": (self.fast_in_scope + self.fast_out_of_scope) / total if total else 0.0,
+        }
+
+
+pre_router = PreRouter()
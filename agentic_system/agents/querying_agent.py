@@ -1,18 +1,91 @@
-from typing import Annotated, Literal
+import os
+import json
+import asyncio
+import contextvars
+from typing import Annotated, Literal, Optional
+from concurrent.futures import ThreadPoolExecutor
 from langchain_core.tools import tool
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.prebuilt import create_react_agent
-from langchain_core.messages import AIMessage
+from langchain_core.messages import AIMessage, SystemMessage, HumanMessage
 from langgraph.types import Command
 from sqlalchemy import text
 from datetime import datetime
 from langchain.agents import create_openai_functions_agent
 from langchain.agents import AgentExecutor
 from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import RunnableLambda
 
 from agentic_system.utils.llm import tool_llm
-from agentic_system.db.db_conn import session_scope
-from agentic_system.utils.utils import generate_embeddings, SimpleState
+from agentic_system.db.db_conn import session_scope, async_session_scope
+from agentic_system.db.product_search import get_search_backend, ProductFilters
+from agentic_system.db.name_resolver import resolve_product_name
+from agentic_system.db.catalog_snapshot import catalog_snapshot, CatalogData
+from agentic_system.utils.utils import generate_embeddings, emit_progress, SimpleState
+from agentic_system.utils.payload import compact_querying_output, PromptTokenRecorder
+from agentic_system.utils.tracing import debug_print, metrics, DEBUG_PRINTS
+
+
+###############################################################################
+# Hot queries
+###############################################################################
+
+# built once: compiled SQL is cached by SQLAlchemy and prepared once per async connection.
+# top-k neighbours are precomputed per product id (dbo.product_neighbours), ordered by rank;
+# names and product details come from the in-memory catalog snapshot, so this is a
+# primary key range scan without joins
+COOCCURRENCES_SQL = text("""
+        SELECT product_id, neighbour_id, cooccurrence_count
+        FROM dbo.product_neighbours
+        WHERE product_id = ANY(:ids) AND rank <= :limit
+        ORDER BY product_id, rank
+    """).execution_options(trace_name="cooccurrences")
+
+# item-to-item lists are materialized per product id (dbo.similar_products), ordered by rank
+SIMILAR_PRODUCTS_SQL = text("""
+        SELECT similar_id, score
+        FROM dbo.similar_products
+        WHERE product_id = :id AND rank <= :limit
+        ORDER BY rank
+    """).execution_options(trace_name="similar_products")
+
+
+def lookup_product_ids(product_names: list[str]) -> tuple[CatalogData, dict[str, int | None]]:
+    """Catalog snapshot and the product ID of each requested name (resolved to a catalog name, None if unknown)."""
+    catalog = catalog_snapshot.get()
+    return catalog, {name: catalog.id_by_name.get(resolve_product_name(name)) for name in product_names}
+
+
+def cooccurrence_rows(catalog: CatalogData, ids: dict[str, int | None], rows: list) -> dict[str, dict]:
+    """Groups (product_id, neighbour_id, count) rows under the requested names, IDs mapped to catalog names.
+
+    Each group also holds the catalog name the requested name was resolved to (None if unknown),
+    so a substituted product is visible to the caller.
+    """
+    by_id = {}
+    for product_id, neighbour_id, count in rows:
+        neighbour = catalog.name(neighbour_id)
+        if neighbour is not None:  # unknown until the snapshot reloads
+            by_id.setdefault(product_id, []).append(
+                {"product1": catalog.name(product_id), "product2": neighbour, "cooccurrence_count": count}
+            )
+    return {
+        name: {
+            "resolved_name": catalog.name(product_id) if product_id is not None else None,
+            "cooccurrences": by_id.get(product_id, []),
+        }
+        for name, product_id in ids.items()
+    }
+
+
+def similar_product_rows(catalog: CatalogData, product_id: int, rows: list) -> list[dict]:
+    """Product details of (similar_id, score) rows, most similar first."""
+    results = []
+    for similar_id, score in rows:
+        product = catalog.row(similar_id)
+        if product is not None:
+            results.append({"similar_to": catalog.name(product_id), **product, "score": round(score, 3)})
+    return results
 
 
 ###############################################################################
@@ -23,44 +96,38 @@ from agentic_system.utils.utils import generate_embeddings, SimpleState
 def distinct_products_tool() -> Annotated[list[str], "A list of unique product names"]:
     
     """Fetches all unique products from products table."""
-    print("Fetching distinct products from products table...")
+    debug_print("Fetching distinct products from products table...")
 
-    query = """
-        SELECT DISTINCT name AS product FROM dbo.products
-    """
-    sql = text(query)
-    
-    with session_scope() as session:
-        results = session.execute(sql).fetchall()
-
-    # Flatten the results into a Python list
-    products = [row[0] for row in results]
+    # names are unique, served from the in-memory catalog snapshot
+    products = catalog_snapshot.get().names.tolist()
 
-    print(f"Found {len(products)} distinct products: {products}.")
+    debug_print(f"Found {len(products)} distinct products.")
     return products
 
 
 @tool
 def cooccurrences_query_tool(
-    product_name: Annotated[str, "Exact product name for co-occurrence lookup (match 'name' column in products table)"],
+    product_name: Annotated[str, "Product name for co-occurrence lookup ('name' column in products table, close variants are resolved)"],
     limit: Annotated[int, "Number of co-ocurrences to return"]=15,
-)-> Annotated[list, "List of co-occurring products with counts. Each item has: product1, product2, cooccurrence_count"]:
+)-> Annotated[dict, "resolved_name (catalog product the name was resolved to) and cooccurrences: list of product1, product2, cooccurrence_count"]:
     
     """
-    Queries the `dbo.cooccurrences` table to get the top related products
-    given a product_name.
+    Gets the products most frequently bought together with a given product, from the
+    co-occurrence neighbours precomputed per product (`dbo.product_neighbours`), strongest first.
 
     Parameters
     ----------
     product_name : str
-        Exact match of product name to search for (matches `product1` or `product2` column).
+        Product name to search for, inexact names are resolved to the closest catalog product.
     limit : int
-        Number of results to return (default: 5).
+        Number of results to return (default: 15).
 
     Returns
     -------
-    list of dict
-        Each dict contains: product1, product2, cooccurrence_count.
+    dict
+        resolved_name: the catalog product name `product_name` was resolved to (None if unknown),
+        cooccurrences: list of dicts with product1 (the resolved product), product2 (a product bought
+        with it) and cooccurrence_count, empty if the product is unknown or has no co-occurrences.
 
     Example input:
     {
@@ -68,75 +135,254 @@ def cooccurrences_query_tool(
         "limit": 15
     }
     """
-    print("Querying co-occurrences...")
-
-    sql = text(f"""
-            SELECT product1, product2, cooccurrence_count
-            FROM dbo.cooccurrences
-            WHERE product1 = :p OR product2 = :p
-            ORDER BY cooccurrence_count DESC
-            LIMIT :limit
-        """)
-    
+    debug_print("Querying co-occurrences...")
+    emit_progress(f"Checking co-occurrences of {product_name}...")
+    catalog, ids = lookup_product_ids([product_name])
+
+    rows = []
+    if ids[product_name] is not None:
+        with session_scope() as session:
+
+            rows = session.execute(
+                COOCCURRENCES_SQL,
+                {
+                    "ids": [ids[product_name]],
+                    "limit": limit
+                }
+            ).all()
+
+    results = cooccurrence_rows(catalog, ids, rows)[product_name]
+
+    debug_print(results)
+    return results
+
+
+@tool
+def multi_cooccurrences_query_tool(
+    product_names: Annotated[list[str], "Product names for co-occurrence lookup ('name' column in products table, close variants are resolved)"],
+    limit: Annotated[int, "Number of co-ocurrences to return per product"]=15,
+)-> Annotated[dict, "Co-occurring products with counts per requested product name"]:
+
+    """
+    Gets the top related products of several products at once, with a single
+    database query (use instead of calling cooccurrences_query_tool once per product).
+
+    Parameters
+    ----------
+    product_names : list of str
+        Product names to search for, inexact names are resolved to the closest catalog products.
+    limit : int
+        Number of results to return per product (default: 15).
+
+    Returns
+    -------
+    dict
+        Maps each requested product name to a dict with resolved_name (the catalog product it was
+        resolved to, None if unknown) and cooccurrences (list of dicts with product1, product2,
+        cooccurrence_count). Products without co-occurrences (or unknown names) have an empty list.
+
+    Example input:
+    {
+        "product_names": ["Zelda: Breath of the Wild", "Mario Kart 8 Deluxe", "Splatoon 3"],
+        "limit": 5
+    }
+    """
+    debug_print("Querying co-occurrences for multiple products...")
+    emit_progress(f"Checking co-occurrences of {', '.join(product_names)}...")
+    catalog, ids = lookup_product_ids(product_names)
+    known = list({product_id for product_id in ids.values() if product_id is not None})
+
+    rows = []
+    if known:
+        with session_scope() as session:
+
+            rows = session.execute(
+                COOCCURRENCES_SQL,
+                {
+                    "ids": known,
+                    "limit": limit
+                }
+            ).all()
+
+    results = cooccurrence_rows(catalog, ids, rows)
+
+    debug_print(results)
+    return results
+
+
+@tool
+def similar_products_tool(
+    product_name: Annotated[str, "Product name to find similar products for ('name' column in products table, close variants are resolved)"],
+    limit: Annotated[int, "Number of similar products to return"]=10,
+) -> Annotated[list, "List of similar products, most similar first"]:
+
+    """
+    Gets the products most similar to a given product ("something like X"), ranked by a precomputed
+    score that blends description similarity and how often the products are bought together.
+
+    Parameters
+    ----------
+    product_name : str
+        Product name to search for, inexact names are resolved to the closest catalog product.
+    limit : int
+        Number of results to return (default: 10).
+
+    Returns
+    -------
+    list of dict
+        Each dict contains: similar_to (the catalog product `product_name` was resolved to), name, release_date, times_sold, store_a, store_b, store_c,
+        type, category, franchise, min_age, major_category, score.
+
+    Example input:
+    {
+        "product_name": "Mario Kart 8 Deluxe",
+        "limit": 5
+    }
+    """
+    debug_print("Querying similar products...")
+    emit_progress(f"Finding products similar to {product_name}...")
+    catalog, ids = lookup_product_ids([product_name])
+    product_id = ids[product_name]
+    if product_id is None:
+        return []
+
     with session_scope() as session:
+        rows = session.execute(SIMILAR_PRODUCTS_SQL, {"id": product_id, "limit": limit}).all()
 
-        session.query()
-        rows = session.execute(
-            sql, 
-            {
-                "p": product_name, 
-                "limit": limit
-            }
-        ).mappings().all()
+    results = similar_product_rows(catalog, product_id, rows)
 
-        print([dict(r) for r in rows])
-        return [dict(r) for r in rows]
+    debug_print(results)
+    return results
 
 
 @tool
 def product_search_tool(
-    query: Annotated[str, "The search query to find Nintendo Switch products"]
-) -> Annotated[list, "List of matching products with distance score"]:
+    query: Annotated[str, "The search query to find Nintendo Switch products"],
+    stores: Annotated[Optional[list[Literal["A", "B", "C"]]], "Only products sold at any of these stores"]=None,
+    max_age: Annotated[Optional[int], "Only products suitable for a person of this age (min_age <= max_age)"]=None,
+    types: Annotated[Optional[list[str]], "Only these product types (e.g. 'Platformer', 'Racing', 'Accessory')"]=None,
+    categories: Annotated[Optional[list[str]], "Only these categories (e.g. 'Game', 'Console', 'Controller')"]=None,
+    franchises: Annotated[Optional[list[str]], "Only these franchises (e.g. 'Super Mario')"]=None,
+    exclude_franchises: Annotated[Optional[list[str]], "Exclude these franchises"]=None,
+    exclude_names: Annotated[Optional[list[str]], "Exclude these exact product names"]=None,
+    limit: Annotated[int, "Number of products to return"]=10,
+) -> Annotated[list, "List of matching products"]:
     """
     Searches the Nintendo Switch product database.
 
     This tool is helpful to know detailed information about products, their categories and specificities. Here you can also find in which stores products are sold.
+    Structured constraints from the user request (store, age, type, category, franchise, exclusions) should be passed
+    as filters: they are applied by the database, so every returned product already satisfies them.
 
     Parameters
     ----------
     query : str
         Search query text to be converted into an embedding.
+    stores : list of str, optional
+        Only products sold at any of these stores ("A", "B", "C").
+    max_age : int, optional
+        Only products suitable for this age (products without age rating are kept).
+    types, categories, franchises : list of str, optional
+        Only products with one of these values.
+    exclude_franchises, exclude_names : list of str, optional
+        Products to leave out.
+    limit : int
+        Number of results to return (default: 10).
 
     Returns
     -------
     list of dict
-        Each dict contains all columns from dbo.products plus a `distance` score.
+        Each dict contains: name, release_date, times_sold, store_a, store_b, store_c, type, category, franchise, min_age, major_category.
 
     Example input:
     {
-        "query": "Mario party multiplayer game"
+        "query": "fun game for a young kid",
+        "stores": ["A"],
+        "max_age": 5,
+        "exclude_franchises": ["Super Mario"]
     }
     """
-    print("Running embedding search...")
+    debug_print("Running embedding search...")
+    emit_progress(f"Searching catalog for '{query}'...")
 
     _, embedding_vector = generate_embeddings(query)
-    
-    # operator <=> for cosine distance
-    sql = text(f"""
-        SELECT name, release_date, times_sold, store_a, store_b, store_c, type, category, franchise, min_age, major_category
-        FROM dbo.products
-        ORDER BY embedding <#> :embedding_vector ASC
-        LIMIT 10
-    """)
-        
-    with session_scope() as session:
-        results = session.execute(
-            sql, 
-            {"embedding_vector": str(embedding_vector)}
-        ).mappings().all()
 
-        print([dict(r) for r in results])
-        return [dict(r) for r in results]
+    filters = ProductFilters(
+        stores=stores,
+        max_age=max_age,
+        types=types,
+        categories=categories,
+        franchises=franchises,
+        exclude_franchises=exclude_franchises,
+        exclude_names=exclude_names,
+    )
+
+    # pgvector (SQL) or in-process numpy search, see PRODUCT_SEARCH_BACKEND
+    results = get_search_backend().search(embedding_vector, k=limit, filters=filters)
+
+    debug_print(results)
+    return results
+
+
+###############################################################################
+# Async tool variants (async engine, used when the graph runs with ainvoke/astream)
+###############################################################################
+
+async def acooccurrences_query_tool(product_name: str, limit: int = 15) -> dict:
+    emit_progress(f"Checking co-occurrences of {product_name}...")
+    # snapshot (re)loads and version checks are blocking, keep them off the event loop
+    catalog, ids = await asyncio.to_thread(lookup_product_ids, [product_name])
+    rows = []
+    if ids[product_name] is not None:
+        async with async_session_scope() as session:
+            rows = (await session.execute(COOCCURRENCES_SQL, {"ids": [ids[product_name]], "limit": limit})).all()
+    return cooccurrence_rows(catalog, ids, rows)[product_name]
+
+
+async def amulti_cooccurrences_query_tool(product_names: list[str], limit: int = 15) -> dict:
+    emit_progress(f"Checking co-occurrences of {', '.join(product_names)}...")
+    catalog, ids = await asyncio.to_thread(lookup_product_ids, product_names)
+    known = list({product_id for product_id in ids.values() if product_id is not None})
+    rows = []
+    if known:
+        async with async_session_scope() as session:
+            rows = (await session.execute(COOCCURRENCES_SQL, {"ids": known, "limit": limit})).all()
+    return cooccurrence_rows(catalog, ids, rows)
+
+
+async def asimilar_products_tool(product_name: str, limit: int = 10) -> list:
+    emit_progress(f"Finding products similar to {product_name}...")
+    catalog, ids = await asyncio.to_thread(lookup_product_ids, [product_name])
+    product_id = ids[product_name]
+    if product_id is None:
+        return []
+    async with async_session_scope() as session:
+        rows = (await session.execute(SIMILAR_PRODUCTS_SQL, {"id": product_id, "limit": limit})).all()
+    return similar_product_rows(catalog, product_id, rows)
+
+
+async def aproduct_search_tool(query: str, stores=None, max_age=None, types=None, categories=None, franchises=None,
+                               exclude_franchises=None, exclude_names=None, limit: int = 10) -> list:
+    emit_progress(f"Searching catalog for '{query}'...")
+    _, embedding_vector = await asyncio.to_thread(generate_embeddings, query)
+
+    filters = ProductFilters(
+        stores=stores,
+        max_age=max_age,
+        types=types,
+        categories=categories,
+        franchises=franchises,
+        exclude_franchises=exclude_franchises,
+        exclude_names=exclude_names,
+    )
+    return await get_search_backend().asearch(embedding_vector, k=limit, filters=filters)
+
+
+# same schema and description, `ainvoke` runs the coroutine instead of the sync function in a thread
+cooccurrences_query_tool.coroutine = acooccurrences_query_tool
+multi_cooccurrences_query_tool.coroutine = amulti_cooccurrences_query_tool
+similar_products_tool.coroutine = asimilar_products_tool
+product_search_tool.coroutine = aproduct_search_tool
 
 
 ###############################################################################
@@ -156,22 +402,39 @@ prompt_template = PromptTemplate(
         type, category, franchise, min_age, major_category, text, tokens, embedding
     )
 
-    - Co-occurrences: Frequency that two products were sold together
-    dbo.cooccurrences(
-        id, product1, product2, cooccurrence_count
+    - Co-occurrences: Products most frequently sold together with each product, precomputed per product and ranked
+    dbo.product_neighbours(
+        product_id, neighbour_id, rank, cooccurrence_count
     )
+    (the co-occurrence tools take product names and return names, not IDs)
 
     Available tools:
-    1. product_search_tool(query: str)
+    1. product_search_tool(query: str, stores: list[str]=None, max_age: int=None, types: list[str]=None, categories: list[str]=None,
+                           franchises: list[str]=None, exclude_franchises: list[str]=None, exclude_names: list[str]=None, limit: int=10)
     - Performs semantic similarity search on dbo.products available at specific stores.
     - query is free text describing what the user wants.
     - This tool is useful to get to know the specifities of the products and which stores sell those products.
+    - Pass every hard constraint of the user request as a filter (e.g. "sold at Store A" -> stores=["A"],
+      "for a 5-year-old" -> max_age=5, "not Super Mario" -> exclude_franchises=["Super Mario"]); all returned products satisfy them.
 
     2. cooccurrences_query_tool(product_name: str, limit: int=15)
-        - Finds products frequently bought together with the given product.
-        - product_name must match exactly a value from dbo.products.name.
+        - Finds products frequently bought together with the given product, strongest first.
+        - product_name should be a value from dbo.products.name, close variants (e.g. "The Legend of Zelda: ...") are resolved automatically.
+        - Returns {{"resolved_name": ..., "cooccurrences": [...]}}: resolved_name is the catalog product actually looked up
+          (null if the product is not in the catalog) and cooccurrences lists its rows as product1, product2, cooccurrence_count.
         - limit sets how many rows to return.
 
+    3. multi_cooccurrences_query_tool(product_names: list[str], limit: int=15)
+        - Same as cooccurrences_query_tool for several products in a single call.
+        - Always use it instead of calling cooccurrences_query_tool several times when the request mentions more than one product.
+        - Returns the rows grouped by requested name, each group with the catalog product name it was resolved to (resolved_name).
+
+    4. similar_products_tool(product_name: str, limit: int=10)
+        - Returns the products most similar to one product, ranked by a precomputed score blending
+          description similarity and co-occurrence, with the full product details.
+        - Use it first for "something like X" / "similar to X" requests: one call answers them.
+        - product_name should be a value from dbo.products.name, close variants (e.g. "The Legend of Zelda: ...") are resolved automatically.
+
     Your task:
     - Read the user request
     - Decide which tools to call and in which order to collect the maximum relevant data.
@@ -179,13 +442,14 @@ prompt_template = PromptTemplate(
     - When calling multiple tools, output a JSON array of tool calls exactly as:
     [
     {{ "name": "product_search_tool", "arguments": {{"query": "..."}} }},
-    {{ "name": "cooccurrences_query_tool", "arguments": {{ "product_name": "..."}} }}
+    {{ "name": "cooccurrences_query_tool", "arguments": {{ "product_name": "..."}} }},
+    {{ "name": "multi_cooccurrences_query_tool", "arguments": {{ "product_names": ["...", "..."]}} }}
     ]
 
     Return the combined result as a JSON object with keys "products" and "cooccurrences".
     {{
-      "products": [... results from product_search_tool if called ...],
-      "cooccurrences": [{{'productX:' [... results from cooccurrences_query_tool if called ...]}}]
+      "products": [... results from product_search_tool and similar_products_tool if called ...],
+      "cooccurrences": [{{'productX': {{"resolved_name": ..., "cooccurrences": [... rows from cooccurrences_query_tool or multi_cooccurrences_query_tool if called ...]}}}}]
     }}
     - If a tool is not called, return an empty list for that field.
     - Always output valid JSON — no extra text, no trailing commas.
@@ -201,36 +465,171 @@ prompt_template = PromptTemplate(
     """
 )
 
+querying_tools = [product_search_tool, cooccurrences_query_tool, multi_cooccurrences_query_tool, similar_products_tool]
+
+# prompt tokens of every agent step are counted for the querying node
+querying_token_recorder = PromptTokenRecorder("querying_node")
+
 # agent supports multiple tool calls per LLM output
 querying_agent = create_openai_functions_agent(
-    tool_llm,
-    tools=[product_search_tool, cooccurrences_query_tool],
+    tool_llm.with_config(callbacks=[querying_token_recorder]),
+    tools=querying_tools,
     prompt=prompt_template
 )
 
+
+###############################################################################
+# Parallel querying (plan all tool calls in one LLM step, run them concurrently)
+###############################################################################
+
+# "agent" (AgentExecutor loop, one LLM round trip per tool step) or "parallel"
+QUERYING_MODE = os.environ.get("QUERYING_MODE", "agent").lower()
+# concurrent tool calls, keep at or below the database pool size
+QUERYING_MAX_WORKERS = int(os.environ.get("QUERYING_MAX_WORKERS", 5))
+
+planning_prompt = """You are a database querying planner for Nintendo Switch product recommendations.
+
+Plan ALL the tool calls needed to collect the data for the user request and emit them together,
+in this single response: they are executed at the same time and you will not get another turn.
+
+Available tools:
+- product_search_tool: semantic search on the product catalog. Pass every hard constraint of the request as a filter
+  (e.g. "sold at Store A" -> stores=["A"], "for a 5-year-old" -> max_age=5, "not Super Mario" -> exclude_franchises=["Super Mario"]).
+- cooccurrences_query_tool: products frequently bought together with one product mentioned by the user.
+- multi_cooccurrences_query_tool: same for several products in one call, use it whenever more than one product is mentioned.
+- similar_products_tool: precomputed ranking of the products most similar to one product, use it for "something like X" requests.
+
+Rules:
+- Maximize information coverage: combine semantic search and co-occurrence data whenever it can improve recommendations.
+- Use co-occurrence tools only for products explicitly named in the request.
+"""
+
+planner_llm = tool_llm.bind_tools(querying_tools, tool_choice="required").with_config(callbacks=[querying_token_recorder])
+tools_by_name = {t.name: t for t in querying_tools}
+tool_pool = ThreadPoolExecutor(max_workers=QUERYING_MAX_WORKERS, thread_name_prefix="querying_tool")
+
+
+def merge_tool_results(calls: list[dict], results: list) -> dict:
+    """Merges planned tool call results (exceptions are skipped) into a {"products", "cooccurrences"} payload."""
+    payload = {"products": [], "cooccurrences": []}
+    seen_products = set()
+    for call, result in zip(calls, results):
+        if isinstance(result, Exception):
+            debug_print(f"Tool {call['name']} failed: {result}")
+            # visible in /health and /metrics even with the debug prints off
+            metrics.inc("dropped_results", "tool", call["name"])
+            continue
+
+        if call["name"] in ("product_search_tool", "similar_products_tool"):
+            # several searches can return the same product, keep the first occurrence
+            for product in result:
+                if product["name"] not in seen_products:
+                    seen_products.add(product["name"])
+                    payload["products"].append(product)
+        elif call["name"] == "cooccurrences_query_tool":
+            payload["cooccurrences"].append({call["args"]["product_name"]: result})
+        else:
+            payload["cooccurrences"].extend({name: rows} for name, rows in result.items())
+
+    return payload
+
+
+def run_tools_in_parallel(user_query: str) -> dict:
+    """Plans every tool call with one LLM call, runs them concurrently and merges the results.
+
+    Returns the same {"products", "cooccurrences"} payload the querying agent is asked to produce.
+    """
+    plan = planner_llm.invoke([SystemMessage(content=planning_prompt), HumanMessage(content=user_query)])
+    debug_print(f"Planned tool calls: {[(c['name'], c['args']) for c in plan.tool_calls]}")
+
+    calls = [c for c in plan.tool_calls if c["name"] in tools_by_name]
+    # each call runs in a copy of the current context, so callbacks and stream writers follow it
+    futures = [
+        tool_pool.submit(contextvars.copy_context().run, tools_by_name[c["name"]].invoke, c["args"])
+        for c in calls
+    ]
+
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append(e)
+    return merge_tool_results(calls, results)
+
+
+async def arun_tools_in_parallel(user_query: str) -> dict:
+    """Async `run_tools_in_parallel`: tool calls run as concurrent coroutines on the async engine."""
+    plan = await planner_llm.ainvoke([SystemMessage(content=planning_prompt), HumanMessage(content=user_query)])
+    debug_print(f"Planned tool calls: {[(c['name'], c['args']) for c in plan.tool_calls]}")
+
+    calls = [c for c in plan.tool_calls if c["name"] in tools_by_name]
+    results = await asyncio.gather(
+        *(tools_by_name[c["name"]].ainvoke(c["args"]) for c in calls),
+        return_exceptions=True
+    )
+    return merge_tool_results(calls, results)
+
 ###############################################################################
 # Node
 ###############################################################################
 
 agent_executor = AgentExecutor(
     agent=querying_agent,
-    tools=[product_search_tool, cooccurrences_query_tool],
+    tools=querying_tools,
     max_iterations=5,
-    verbose=True,
+    verbose=DEBUG_PRINTS,
     handle_parsing_errors=True
 )
 
 def querying_node(simple_state: SimpleState) -> Command[Literal["recommendation_supervisor_node"]]:
-    print(f"Querying Node: {datetime.now()}")
+    debug_print(f"Querying Node: {datetime.now()}")
+    emit_progress("Querying the product database...")
+
+    user_query = simple_state["messages"][-1].content
+
+    if QUERYING_MODE == "parallel":
+        output = run_tools_in_parallel(user_query)
+    else:
+        #result = querying_agent.invoke(simple_state)
+        output = agent_executor.invoke({"input": user_query})["output"]
 
-    #result = querying_agent.invoke(simple_state)
-    result = agent_executor.invoke({"input": simple_state["messages"][-1].content})
+    # compact, token-budgeted tables instead of raw JSON rows
+    output = compact_querying_output(output)
     
     return Command(
         update={
             "messages": [
-                AIMessage (content=result["output"], name="querying_node")  
+                AIMessage (content=output, name="querying_node")  
             ]
         },
         goto="recommendation_supervisor_node",
-    )
\ No newline at end of file
+    )
+
+
+async def aquerying_node(simple_state: SimpleState) -> Command[Literal["recommendation_supervisor_node"]]:
+    """Async `querying_node`: tools query the async engine instead of holding a worker thread per query."""
+    debug_print(f"Querying Node: {datetime.now()}")
+    emit_progress("Querying the product database...")
+
+    user_query = simple_state["messages"][-1].content
+
+    if QUERYING_MODE == "parallel":
+        output = await arun_tools_in_parallel(user_query)
+    else:
+        output = (await agent_executor.ainvoke({"input": user_query}))["output"]
+
+    output = compact_querying_output(output)
+
+    return Command(
+        update={
+            "messages": [
+                AIMessage (content=output, name="querying_node")
+            ]
+        },
+        goto="recommendation_supervisor_node",
+    )
+
+
+# graph node: `invoke` runs querying_node, `ainvoke`/`astream` run aquerying_node
+querying_runnable = RunnableLambda(querying_node, afunc=aquerying_node, name="querying_node")
\ No newline at end of file
@@ -1,6 +1,6 @@
+import json
 from typing import Annotated, Literal, List
 from langchain_core.tools import tool
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.prebuilt import create_react_agent
 from langchain_core.messages import AIMessage
 from langgraph.graph import END
@@ -9,68 +9,88 @@ from datetime import datetime
 
 
 from agentic_system.utils.llm import tool_llm, infer_llm
-from agentic_system.utils.utils import QueriesOutputs, SimpleState
+from agentic_system.utils.utils import QueriesOutputs, SimpleState, emit_progress, USER_FACING_TAG
+from agentic_system.utils.payload import window_messages, record_prompt_tokens
+from agentic_system.utils.tracing import debug_print
 
 
-@tool
+# return_direct: the tool output (the streamed user-facing tokens) is the agent's final answer,
+# the agent LLM does not rewrite it, so streamed and returned text are the same
+@tool(return_direct=True)
 def recommendation_engine_tool(
     query: Annotated[str, "The usr query"],
     queried_info: Annotated[List[QueriesOutputs], "Queried product data"]
 ) -> Annotated[str, "Product(s) recommendation"]:
-    """Uses the background and research sources to write a newspaper article with the given headeline"""
+    """Writes the customer-facing recommendation for the user query from the queried product data"""
 
-    print ("Writing recommendation")
+    debug_print("Writing recommendation")
 
+    # return_direct: this is the model that writes the user's answer, so all data-usage and output rules live here
     messages = [
-        ("system", """You are an experienced Nintendo Switch product recommendation specialist. Your role is to interpret user queries accurately and provide tailored, data-driven recommendations for Nintendo Switch consoles, games, and accessories.
-         
+        ("system", """You are an experienced Nintendo Switch product recommendation specialist.
+        Your role is to interpret user requests accurately and provide tailored, data-driven product recommendations for Nintendo Switch products.
+
         The information you need to answer the user query is the queried data from the database.
-        Provide a tailored product recommendation.
+
+        Data usage rules:
+        - You may only recommend products that appear in the queried database results provided to you.
+        - You must only use the information contained in the retrieved data — no external knowledge, no assumptions, no made-up details.
+        - If the requested type of product is not present in the retrieved data, state that no suitable recommendations are available.
+
+        Recommendation guidelines:
+        - Provide recommendations that are directly relevant to the user’s expressed needs, preferences, or constraints.
+        - Prioritize accuracy, clarity, and relevance over quantity — better to give fewer, more targeted suggestions than a long generic list.
+        - Use only attributes present in the retrieved data (e.g., name, type, category, franchise, release_date, min_age, times_sold) to justify your recommendations.
+        - When possible, explain briefly why each recommended product is a good fit, using only retrieved attributes.
+        - If multiple suitable products are found, order them logically (e.g., by relevance, popularity, or release date) based on available fields in the retrieved data.
+
+        Output requirements:
+        - Output only the product recommendation(s) — no extra commentary or meta-text.
+        - Do not include raw database rows or unrelated products.
+        - Use clear, natural language suitable for a customer-facing recommendation.
         """),
         (
-            "AIMessage",
+            "human",
             f"""
-            Queried data: {queried_info}
+            Queried data: {json.dumps(queried_info, ensure_ascii=False, separators=(",", ":"), default=str)}
             User query: {query}
             """,
         ),
     ]
-    response = infer_llm.invoke(messages)
-    print ("RESP", response)
-    return response
+    record_prompt_tokens("recommendation_engine_tool", messages)
+    # tagged so that its tokens are streamed to the caller as they arrive
+    response = infer_llm.invoke(messages, config={"tags": [USER_FACING_TAG]})
+    debug_print("RESP", response)
+    return response.content
 
 
+def conversation_window(state) -> dict:
+    """Runs before each LLM call of the agent: older turns beyond the token cap are not sent."""
+    return {"llm_input_messages": window_messages(state["messages"])}
+
+
+# no checkpointer of its own: the conversation lives in the state passed by the graph
+# (checkpointed per session by the bounded graph checkpointer), each run starts from it
 recommendation_agent = create_react_agent(
     tool_llm, 
     tools=[recommendation_engine_tool], 
-    checkpointer = MemorySaver(),
+    checkpointer=False,
+    pre_model_hook=conversation_window,
     prompt="""
     You are an experienced Nintendo Switch product recommendation specialist.
-    Your role is to interpret user requests accurately and provide tailored, data-driven product recommendations for Nintendo Switch products.
-
-    Data usage rules:
-    - You may only recommend products that appear in the queried database results provided to you.
-    - You must only use the information contained in the retrieved data — no external knowledge, no assumptions, no made-up details.
-    - If the requested type of product is not present in the retrieved data, state that no suitable recommendations are available.
-
-    Recommendation guidelines:
-    - Provide recommendations that are directly relevant to the user’s expressed needs, preferences, or constraints.
-    - Prioritize accuracy, clarity, and relevance over quantity — better to give fewer, more targeted suggestions than a long generic list.
-    - Use only attributes present in the retrieved data (e.g., name, type, category, franchise, release_date, min_age, times_sold) to justify your recommendations.
-    - When possible, explain briefly why each recommended product is a good fit, using only retrieved attributes.
-    - If multiple suitable products are found, order them logically (e.g., by relevance, popularity, or release date) based on available fields in the retrieved data.
-
-    Output requirements:
-    - Output only the product recommendation(s) — no extra commentary or meta-text.
-    - Do not include raw database rows or unrelated products.
-    - Use clear, natural language suitable for a customer-facing recommendation.
+    Your role is to hand the user request and the queried product data to the recommendation tool, which writes the final answer.
+
+    - Call `recommendation_engine_tool` once, with the user request as `query` and all the queried database results as `queried_info`.
+    - Pass the queried data as given — do not filter, summarize or add products to it.
     """,
     name='recommendation_agent'
 )
 
 def recommendation_specialist_node(simple_state: SimpleState) -> Command[Literal["recommendation_supervisor_node", END]]:
-    print(f"Supervisor Node: {datetime.now()}")
+    debug_print(f"Supervisor Node: {datetime.now()}")
+    emit_progress("Writing recommendation...")
 
+    record_prompt_tokens("recommendation_specialist_node", window_messages(simple_state["messages"]))
     result = recommendation_agent.invoke(simple_state)
     
     return Command(
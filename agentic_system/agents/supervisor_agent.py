@@ -1,12 +1,15 @@
 from typing import Literal
 from typing_extensions import TypedDict
-from langchain_core.messages import AIMessage
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage
 from langgraph.graph import END
 from langgraph.types import Command
 from datetime import datetime
 
 from agentic_system.utils.llm import tool_llm, infer_llm
-from agentic_system.utils.utils import SimpleState
+from agentic_system.utils.utils import SimpleState, USER_FACING_TAG
+from agentic_system.utils.payload import routing_view, window_messages, record_prompt_tokens
+from agentic_system.utils.tracing import debug_print
+from agentic_system.agents.pre_router import pre_router, PRE_ROUTER_ENABLED, CANNED_REFUSAL
 
 
 recommendation_system_members = ["querying_node", "recommendation_specialist_node"]
@@ -39,21 +42,43 @@ class Router(TypedDict):
 
 
 def recommendation_supervisor_node(state: SimpleState) -> Command[Literal[*recommendation_system_members, END]]:
-    print('STATE MESSAGES')
-    print(state["messages"])
-    print('\n')
+
+    # first hop: clear-cut requests are routed locally, without an LLM call
+    if PRE_ROUTER_ENABLED and len(state["messages"]) == 1:
+        decision = pre_router.route(state["messages"][-1].content)
+        if decision == "out_of_scope":
+            return Command(
+                goto=END,
+                update={
+                    "messages": state["messages"] + [AIMessage(content=CANNED_REFUSAL)],
+                    "next": END
+                }
+            )
+        if decision == "querying_node":
+            return Command(goto="querying_node", update={"next": "querying_node"})
+
+    debug_print('STATE MESSAGES')
+    debug_print(state["messages"])
+    debug_print('\n')
+
+    # multi-turn sessions: turns beyond the token cap are dropped from the state as well,
+    # so the checkpointed conversation and every later prompt stay bounded
+    history = window_messages(state["messages"])
+    kept_ids = {message.id for message in history}
+    dropped = [RemoveMessage(id=message.id) for message in state["messages"] if message.id not in kept_ids]
 
     messages = [
         {"role": "system", "content": system_prompt},
-    ] + state["messages"]
+    ] + routing_view(history)
 
-    print(f"Supervisor: {datetime.now()}")
-    print(f"len(messages): {len(messages)}")
-    print ("==========================================\n",messages[-1],"\n\n")
+    debug_print(f"Supervisor: {datetime.now()}")
+    debug_print(f"len(messages): {len(messages)}")
+    debug_print("==========================================\n",messages[-1],"\n\n")
 
+    record_prompt_tokens("recommendation_supervisor_node", messages)
     response = tool_llm.with_structured_output(Router).invoke(messages)
 
-    print ("\nRESPONSE",response,"\n")
+    debug_print("\nRESPONSE",response,"\n")
 
     # goto = response["next"]
     # if goto == "FINISH":
@@ -68,7 +93,8 @@ def recommendation_supervisor_node(state: SimpleState) -> Command[Literal[*recom
 
     goto = response["next"]
     if goto == "FINISH":
-        if len(messages) == 2:
+        # nothing answered yet in this turn: the request is out of scope
+        if isinstance(state["messages"][-1], HumanMessage):
             user_message = state["messages"][-1].content
         
             refusal_prompt = f"""
@@ -78,7 +104,10 @@ def recommendation_supervisor_node(state: SimpleState) -> Command[Literal[*recom
             and (optionally) invite them to ask something about Nintendo Switch products.
             """
             
-            refusal_text = infer_llm.invoke([{"role": "system", "content": refusal_prompt}]).content
+            refusal_text = infer_llm.invoke(
+                [{"role": "system", "content": refusal_prompt}],
+                config={"tags": [USER_FACING_TAG]}
+            ).content
             goto=END
 
             return Command(
@@ -90,5 +119,8 @@ def recommendation_supervisor_node(state: SimpleState) -> Command[Literal[*recom
             )
         else:
             goto = END
-        
-    return Command(goto=goto, update={"next": goto})
\ No newline at end of file
+
+    update = {"next": goto}
+    if dropped:
+        update["messages"] = dropped
+    return Command(goto=goto, update=update)
\ No newline at end of file
@@ -0,0 +1,264 @@
+import io
+import hashlib
+import numpy as np
+import pandas as pd
+from datetime import date
+from sqlalchemy import select, text
+
+from agentic_system.db.db_schemas import Product
+from agentic_system.db.vector_index import create_vector_index, index_name, VECTOR_INDEX_TYPE
+from agentic_system.db.cooccurrence_graph import build_product_neighbours
+from agentic_system.db.item_similarity import refresh_similar_products
+
+# columns loaded from the catalog files (id is owned by the database, name is the stable key)
+PRODUCT_LOAD_COLUMNS = [
+    "name", "release_date", "times_sold", "store_a", "store_b", "store_c",
+    "type", "category", "franchise", "min_age", "major_category", "text", "tokens", "embedding",
+]
+COOCCURRENCE_LOAD_COLUMNS = ["product1", "product2", "cooccurrence_count", "lift", "pmi"]
+
+# IVFFlat clusters drift when many rows change, rebuild above this fraction of changed products
+IVFFLAT_REBUILD_FRACTION = 0.1
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+###############################################################################
+# Bulk loading helpers
+###############################################################################
+
+def _copy_value(value) -> str:
+    """Value in COPY text format (tab separated, \\N for NULL)."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return "[" + ",".join(repr(float(v)) for v in value) + "]"  # pgvector text format
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def copy_rows(session, table: str, columns: list[str], rows: list[dict] | pd.DataFrame):
+    """Bulk loads `rows` into `table` with COPY, inside the session's transaction.
+
+    DataFrames (large scalar tables such as co-occurrences) are serialized as CSV in one
+    vectorized call instead of value by value.
+    """
+    buffer = io.StringIO()
+    if isinstance(rows, pd.DataFrame):
+        # missing columns and NaN -> unquoted empty field -> NULL
+        rows.reindex(columns=columns).to_csv(buffer, header=False, index=False)
+        options = " WITH (FORMAT csv)"
+    else:
+        for row in rows:
+            buffer.write("\t".join(_copy_value(row.get(column)) for column in columns) + "\n")
+        options = ""
+    buffer.seek(0)
+
+    cursor = session.connection().connection.cursor()
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN{options}", buffer)
+
+
+def create_staging_table(session, table: str, source: str, columns: list[str]):
+    """Empty temporary table with the column types of `source`, dropped at commit."""
+    session.execute(text(f"DROP TABLE IF EXISTS {table}"))
+    session.execute(text(
+        f"CREATE TEMP TABLE {table} ON COMMIT DROP AS SELECT {', '.join(columns)} FROM {source} WITH NO DATA"
+    ))
+
+
+def ensure_product_key(session):
+    """Makes `dbo.products.name` unique (databases created before it was the upsert key)."""
+    session.execute(text("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_indexes
+                WHERE schemaname = 'dbo' AND indexname = 'ix_products_name' AND indexdef LIKE 'CREATE UNIQUE%'
+            ) THEN
+                DROP INDEX IF EXISTS dbo.ix_products_name;
+                CREATE UNIQUE INDEX ix_products_name ON dbo.products (name);
+            END IF;
+        END $$
+    """))
+
+
+def ensure_cooccurrence_scores(session):
+    """Adds the lift/pmi columns to `dbo.cooccurrences` (databases created before they existed)."""
+    session.execute(text(
+        "ALTER TABLE dbo.cooccurrences ADD COLUMN IF NOT EXISTS lift double precision, "
+        "ADD COLUMN IF NOT EXISTS pmi double precision"
+    ))
+
+
+###############################################################################
+# Embeddings
+###############################################################################
+
+def needs_embedding(product: dict) -> bool:
+    """True when the product has no embedding or its text changed since it was embedded."""
+    if product.get("embedding") is None:
+        return True
+    # embeddings from before `text_hash` was recorded are trusted
+    return product.get("text_hash", text_hash(product["text"])) != text_hash(product["text"])
+
+
+def reuse_stored_embeddings(session, product_data: list[dict]) -> int:
+    """Copies embeddings from `dbo.products` to products whose text did not change. Returns how many."""
+    pending = {p["name"]: p for p in product_data if needs_embedding(p)}
+    if not pending:
+        return 0
+
+    stored = session.execute(
+        select(Product.name, Product.text, Product.tokens, Product.embedding)
+        .where(Product.name.in_(list(pending)), Product.embedding.is_not(None))
+    ).all()
+
+    reused = 0
+    for name, stored_text, tokens, embedding in stored:
+        product = pending[name]
+        if stored_text == product["text"]:
+            product["tokens"], product["embedding"] = tokens, np.asarray(embedding, dtype=np.float32)
+            product["text_hash"] = text_hash(product["text"])
+            reused += 1
+    return reused
+
+
+###############################################################################
+# Upserts
+###############################################################################
+
+def _distinct(columns: list[str], left: str, right: str) -> str:
+    return f"({', '.join(f'{left}.{c}' for c in columns)}) IS DISTINCT FROM ({', '.join(f'{right}.{c}' for c in columns)})"
+
+
+def upsert_products(session, product_data: list[dict], delete_missing: bool = True, changed_names: set | None = None) -> dict:
+    """Upserts products by name through a COPY-loaded staging table.
+
+    Only new or changed rows are written and, with `delete_missing`, products absent from
+    `product_data` are deleted (their neighbours cascade). Statements with nothing to do are
+    skipped, so an unchanged catalog does not bump `dbo.catalog_versions`. The names of the
+    written and deleted products are added to `changed_names`, if given.
+    """
+    changed_names = changed_names if changed_names is not None else set()
+    columns = PRODUCT_LOAD_COLUMNS
+    values = [c for c in columns if c != "name"]
+    create_staging_table(session, "stage_products", "dbo.products", columns)
+    copy_rows(session, "stage_products", columns, product_data)
+
+    changed = f"""
+        SELECT s.* FROM stage_products s
+        LEFT JOIN dbo.products p ON p.name = s.name
+        WHERE p.id IS NULL OR {_distinct(values, "p", "s")}
+    """
+    stats = {"inserted": 0, "updated": 0, "deleted": 0}
+
+    if session.execute(text(f"SELECT count(*) FROM ({changed}) AS c")).scalar():
+        rows = session.execute(text(f"""
+            INSERT INTO dbo.products ({", ".join(columns)})
+            SELECT {", ".join(columns)} FROM ({changed}) AS c
+            ON CONFLICT (name) DO UPDATE SET {", ".join(f"{c} = EXCLUDED.{c}" for c in values)}
+            RETURNING name, (xmax = 0) AS inserted
+        """)).all()
+        stats["inserted"] = sum(inserted for _, inserted in rows)
+        stats["updated"] = len(rows) - stats["inserted"]
+        changed_names.update(name for name, _ in rows)
+
+    if delete_missing:
+        missing = "FROM dbo.products p WHERE NOT EXISTS (SELECT 1 FROM stage_products s WHERE s.name = p.name)"
+        if session.execute(text(f"SELECT count(*) {missing}")).scalar():
+            deleted = session.execute(text(
+                f"DELETE FROM dbo.products WHERE id IN (SELECT p.id {missing}) RETURNING name"
+            )).scalars().all()
+            stats["deleted"] = len(deleted)
+            changed_names.update(deleted)
+
+    return stats
+
+
+def upsert_cooccurrences(session, cooccurrences: list[dict] | pd.DataFrame, delete_missing: bool = True,
+                         changed_names: set | None = None) -> dict:
+    """Upserts normalized (product1 <= product2) pairs on `uq_product_pair`, same rules as `upsert_products`.
+
+    Pairs without lift/pmi (precomputed counts) store NULL scores. Both product names of the
+    written and deleted pairs are added to `changed_names`, if given.
+    """
+    changed_names = changed_names if changed_names is not None else set()
+    columns = COOCCURRENCE_LOAD_COLUMNS
+    values = [c for c in columns if c not in ("product1", "product2")]
+    create_staging_table(session, "stage_cooccurrences", "dbo.cooccurrences", columns)
+    copy_rows(session, "stage_cooccurrences", columns, cooccurrences)
+
+    changed = f"""
+        SELECT s.* FROM stage_cooccurrences s
+        LEFT JOIN dbo.cooccurrences c ON c.product1 = s.product1 AND c.product2 = s.product2
+        WHERE c.id IS NULL OR {_distinct(values, "c", "s")}
+    """
+    stats = {"inserted": 0, "updated": 0, "deleted": 0}
+
+    if session.execute(text(f"SELECT count(*) FROM ({changed}) AS c")).scalar():
+        rows = session.execute(text(f"""
+            INSERT INTO dbo.cooccurrences ({", ".join(columns)})
+            SELECT {", ".join(columns)} FROM ({changed}) AS c
+            ON CONFLICT ON CONSTRAINT uq_product_pair DO UPDATE SET {", ".join(f"{c} = EXCLUDED.{c}" for c in values)}
+            RETURNING product1, product2, (xmax = 0) AS inserted
+        """)).all()
+        stats["inserted"] = sum(inserted for _, _, inserted in rows)
+        stats["updated"] = len(rows) - stats["inserted"]
+        changed_names.update(name for product1, product2, _ in rows for name in (product1, product2))
+
+    if delete_missing:
+        missing = """
+            FROM dbo.cooccurrences c WHERE NOT EXISTS (
+                SELECT 1 FROM stage_cooccurrences s WHERE s.product1 = c.product1 AND s.product2 = c.product2
+            )
+        """
+        if session.execute(text(f"SELECT count(*) {missing}")).scalar():
+            deleted = session.execute(text(
+                f"DELETE FROM dbo.cooccurrences WHERE id IN (SELECT c.id {missing}) RETURNING product1, product2"
+            )).all()
+            stats["deleted"] = len(deleted)
+            changed_names.update(name for pair in deleted for name in pair)
+
+    return stats
+
+
+###############################################################################
+# Derived data
+###############################################################################
+
+def refresh_derived(session, product_stats: dict, cooccurrence_stats: dict, reindex: bool = False,
+                    changed_products: set[str] | None = None):
+    """Refreshes the tables and indexes derived from products and co-occurrences, when they changed.
+
+    `changed_products` (names filled by the upserts) limits the item-to-item refresh to the
+    affected lists, all of them are rebuilt if None.
+    """
+    products_changed = sum(product_stats.values())
+    cooccurrences_changed = sum(cooccurrence_stats.values())
+
+    if products_changed or cooccurrences_changed:
+        print('Precomputing co-occurrence neighbours')
+        build_product_neighbours(session)
+
+    if products_changed:
+        session.execute(text("ANALYZE dbo.products"))
+
+    # HNSW is maintained on every insert/update, IVFFlat lists are only computed at build time
+    index_exists = session.execute(text(f"SELECT to_regclass('dbo.{index_name('products')}')")).scalar() is not None
+    n_products = session.execute(text("SELECT count(*) FROM dbo.products")).scalar()
+    drifted = (
+        VECTOR_INDEX_TYPE == "ivfflat"
+        and products_changed > IVFFLAT_REBUILD_FRACTION * max(n_products, 1)
+    )
+    if reindex or drifted or (VECTOR_INDEX_TYPE != "none" and not index_exists):
+        print(f'Creating {VECTOR_INDEX_TYPE} vector index on product embeddings')
+        create_vector_index(session)
+
+    # after the index: candidates are ANN lookups
+    similar_missing = not session.execute(text("SELECT EXISTS (SELECT 1 FROM dbo.similar_products)")).scalar()
+    if products_changed or cooccurrences_changed or (similar_missing and n_products):
+        print('Refreshing item-to-item similar products')
+        refresh_similar_products(session, changed_products)
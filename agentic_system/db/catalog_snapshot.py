@@ -0,0 +1,85 @@
+import threading
+import numpy as np
+from sqlalchemy import text
+
+from agentic_system.db.db_conn import session_scope
+from agentic_system.db.catalog_version import CatalogVersionWatcher
+from agentic_system.db.product_search import PRODUCT_COLUMNS
+from agentic_system.utils.tracing import debug_print
+
+
+###############################################################################
+# In-memory catalog snapshot
+###############################################################################
+
+class CatalogData:
+    """One immutable version of the product catalog: columnar attributes plus name/ID maps.
+
+    Readers keep a reference to the object they got, a reload swaps in a new one.
+    """
+
+    def __init__(self, version: tuple[int, ...], ids: np.ndarray, columns: dict[str, np.ndarray]):
+        self.version = version
+        self.ids = ids
+        self.columns = columns
+        self.names = columns["name"]
+        self.id_by_name = {name: int(product_id) for name, product_id in zip(self.names, ids)}
+        self.position_by_id = {int(product_id): position for position, product_id in enumerate(ids)}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def row(self, product_id: int) -> dict | None:
+        """Product attributes (`PRODUCT_COLUMNS`) of `product_id`, None if unknown."""
+        position = self.position_by_id.get(product_id)
+        if position is None:
+            return None
+        return {column: self.columns[column][position] for column in PRODUCT_COLUMNS}
+
+    def name(self, product_id: int) -> str | None:
+        position = self.position_by_id.get(product_id)
+        return None if position is None else self.names[position]
+
+
+class CatalogSnapshot:
+    """Process-wide, read-only copy of `dbo.products` attributes (no embeddings, no texts).
+
+    Loaded on first use (or at startup) and reloaded when the catalog version of `dbo.products`
+    changes, so tools resolve names, IDs and product details without a database round trip.
+    """
+
+    def __init__(self):
+        self.watcher = CatalogVersionWatcher(tables=("products",))
+        self._lock = threading.Lock()
+        self._data = None
+
+    def _load(self, version: tuple[int, ...]) -> CatalogData:
+        with session_scope() as session:
+            results = session.execute(
+                text(f"SELECT id, {', '.join(PRODUCT_COLUMNS)} FROM dbo.products ORDER BY id")
+                .execution_options(trace_name="catalog_snapshot")
+            ).all()
+
+        ids = np.asarray([result[0] for result in results], dtype=np.int64)
+        columns = {}
+        for i, column in enumerate(PRODUCT_COLUMNS, start=1):
+            values = np.empty(len(results), dtype=object)
+            values[:] = [result[i] for result in results]
+            columns[column] = values
+        return CatalogData(version, ids, columns)
+
+    def get(self) -> CatalogData:
+        """Current catalog, reloaded first if `dbo.products` changed."""
+        version = self.watcher.current()
+        data = self._data
+        if data is not None and data.version == version:
+            return data
+
+        with self._lock:
+            if self._data is None or self._data.version != version:
+                self._data = self._load(version)
+                debug_print(f"Loaded {len(self._data)} products into the catalog snapshot (catalog version {version})")
+            return self._data
+
+
+catalog_snapshot = CatalogSnapshot()
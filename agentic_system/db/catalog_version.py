@@ -0,0 +1,84 @@
+import os
+import time
+import threading
+from sqlalchemy import text
+from dotenv import load_dotenv
+
+from agentic_system.db.db_conn import session_scope
+
+load_dotenv()
+
+# catalog tables whose changes invalidate in-process copies of the data
+VERSIONED_TABLES = ("products", "cooccurrences")
+
+# how often (seconds) in-process consumers re-check the catalog version
+CATALOG_VERSION_CHECK_S = float(os.environ.get("CATALOG_VERSION_CHECK_S", 5))
+
+
+###############################################################################
+# Version bookkeeping (database side)
+###############################################################################
+
+def install_version_triggers(conn, tables: tuple[str, ...] = VERSIONED_TABLES, schema: str = "dbo"):
+    """Creates statement-level triggers that bump `dbo.catalog_versions` on any write.
+
+    Any INSERT/UPDATE/DELETE/TRUNCATE on a versioned table, from the ingest or from anywhere
+    else, increments that table's version in the same transaction.
+    """
+    conn.execute(text(f"""
+        CREATE OR REPLACE FUNCTION {schema}.bump_catalog_version() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO {schema}.catalog_versions (table_name, version, updated_at)
+            VALUES (TG_TABLE_NAME, 1, now())
+            ON CONFLICT (table_name)
+            DO UPDATE SET version = {schema}.catalog_versions.version + 1, updated_at = now();
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """))
+
+    for table in tables:
+        conn.execute(text(f"DROP TRIGGER IF EXISTS trg_{table}_catalog_version ON {schema}.{table}"))
+        conn.execute(text(f"""
+            CREATE TRIGGER trg_{table}_catalog_version
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {schema}.{table}
+            FOR EACH STATEMENT EXECUTE FUNCTION {schema}.bump_catalog_version()
+        """))
+
+
+def get_catalog_version(tables: tuple[str, ...] = VERSIONED_TABLES) -> tuple[int, ...]:
+    """Current version of each requested table (0 if it was never written)."""
+    with session_scope() as session:
+        rows = session.execute(
+            text("SELECT table_name, version FROM dbo.catalog_versions WHERE table_name = ANY(:tables)"),
+            {"tables": list(tables)}
+        ).all()
+    versions = dict(rows)
+    return tuple(versions.get(table, 0) for table in tables)
+
+
+###############################################################################
+# Version watcher (process side)
+###############################################################################
+
+class CatalogVersionWatcher:
+    """Tells in-process caches when the catalog they were built from has changed.
+
+    The version query is issued at most once every `check_interval` seconds, so calling
+    `current()` on every request costs nothing most of the time.
+    """
+
+    def __init__(self, tables: tuple[str, ...] = VERSIONED_TABLES, check_interval: float = CATALOG_VERSION_CHECK_S):
+        self.tables = tables
+        self.check_interval = check_interval
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self) -> tuple[int, ...]:
+        with self._lock:
+            now = time.monotonic()
+            if self._version is None or now - self._checked_at >= self.check_interval:
+                self._version = get_catalog_version(self.tables)
+                self._checked_at = now
+            return self._version
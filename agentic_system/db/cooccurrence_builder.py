@@ -0,0 +1,137 @@
+import os
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# order lines read per chunk of the basket file
+BASKET_CHUNK_ROWS = int(os.environ.get("BASKET_CHUNK_ROWS", 1_000_000))
+# baskets with more distinct products are skipped (bulk orders), each one adds k*(k-1)/2 pairs
+BASKET_MAX_PRODUCTS = int(os.environ.get("BASKET_MAX_PRODUCTS", 50))
+# pair keys buffered before they are merged into the running totals
+COOCCURRENCE_COMPACT_PAIRS = int(os.environ.get("COOCCURRENCE_COMPACT_PAIRS", 10_000_000))
+
+# a pair of product codes is packed in one int64 key: code1 << 32 | code2
+_CODE_BITS = 32
+_CODE_MASK = (1 << _CODE_BITS) - 1
+
+
+def normalize_pairs(df: pd.DataFrame, left: str = "product1", right: str = "product2") -> pd.DataFrame:
+    """Orders every pair so that `left` <= `right` (vectorized), inverse pairs become duplicates."""
+    df = df.copy()
+    swap = (df[left] > df[right]).to_numpy()
+    df.loc[swap, [left, right]] = df.loc[swap, [right, left]].to_numpy()
+    return df
+
+
+###############################################################################
+# Streaming pair counter
+###############################################################################
+
+class CooccurrenceCounter:
+    """Counts how many baskets contain each product pair, chunk by chunk.
+
+    Products are encoded to integer codes as they are seen and the pairs of each chunk are
+    counted with `np.unique` over packed int64 keys, i.e. a sparse COO matrix accumulated with
+    vectorized operations. Memory is bounded by the distinct pairs plus one buffer of
+    `compact_pairs` keys, independent of the number of baskets.
+    """
+
+    def __init__(self, max_basket_products: int = BASKET_MAX_PRODUCTS, compact_pairs: int = COOCCURRENCE_COMPACT_PAIRS):
+        self.max_basket_products = max_basket_products
+        self.compact_pairs = compact_pairs
+
+        self.products = pd.Index([], dtype=object)          # code -> product name
+        self.item_counts = np.zeros(0, dtype=np.int64)      # baskets containing each product
+        self.n_baskets = 0
+        self.skipped_baskets = 0
+
+        self.keys = np.zeros(0, dtype=np.int64)             # distinct pair keys, sorted
+        self.counts = np.zeros(0, dtype=np.int64)
+        self._buffer = []
+        self._buffered = 0
+
+    def _encode(self, products: pd.Series) -> np.ndarray:
+        codes = self.products.get_indexer(products)
+        if (codes < 0).any():
+            self.products = self.products.append(pd.Index(pd.unique(products[codes < 0]), dtype=object))
+            codes = self.products.get_indexer(products)
+        return codes.astype(np.int64)
+
+    def add(self, orders: pd.Series, products: pd.Series):
+        """Counts the pairs of complete baskets, given as one row per order line."""
+        frame = pd.DataFrame({"order": orders.to_numpy(), "product": self._encode(products)}).drop_duplicates()
+
+        sizes = frame.groupby("order")["product"].transform("size")
+        oversized = (sizes > self.max_basket_products).to_numpy()
+        self.skipped_baskets += frame.loc[oversized, "order"].nunique()
+        frame = frame[~oversized]
+
+        self.n_baskets += frame["order"].nunique()
+        counts = np.bincount(frame["product"].to_numpy(), minlength=len(self.products))
+        self.item_counts = np.concatenate([self.item_counts, np.zeros(len(counts) - len(self.item_counts), dtype=np.int64)])
+        self.item_counts += counts
+
+        # all product pairs within each basket, each unordered pair once
+        pairs = frame.merge(frame, on="order")
+        pairs = pairs[pairs["product_x"] < pairs["product_y"]]
+        keys = (pairs["product_x"].to_numpy() << _CODE_BITS) | pairs["product_y"].to_numpy()
+
+        self._buffer.append(keys)
+        self._buffered += len(keys)
+        if self._buffered >= self.compact_pairs:
+            self._compact()
+
+    def _compact(self):
+        """Merges the buffered keys into the running (key, count) totals."""
+        if not self._buffer:
+            return
+        keys, counts = np.unique(np.concatenate(self._buffer), return_counts=True)
+        self._buffer, self._buffered = [], 0
+
+        keys = np.concatenate([self.keys, keys])
+        counts = np.concatenate([self.counts, counts])
+        self.keys, inverse = np.unique(keys, return_inverse=True)
+        self.counts = np.bincount(inverse, weights=counts).astype(np.int64)
+
+    def add_csv(self, path: str, order_column: str = "order_id", product_column: str = "product",
+                chunk_rows: int = BASKET_CHUNK_ROWS):
+        """Counts a CSV of order lines read in chunks.
+
+        The file must be grouped by order (as exported, one order after the other): the lines of
+        the last order of each chunk are carried over to the next one, so baskets are never split.
+        """
+        carry = None
+        chunks = pd.read_csv(path, usecols=[order_column, product_column], dtype={product_column: str}, chunksize=chunk_rows)
+        for chunk in chunks:
+            chunk = chunk.dropna()
+            if carry is not None:
+                chunk = pd.concat([carry, chunk], ignore_index=True)
+            if chunk.empty:
+                continue
+            last = (chunk[order_column] == chunk[order_column].iloc[-1]).to_numpy()
+            carry = chunk[last]
+            self.add(chunk.loc[~last, order_column], chunk.loc[~last, product_column])
+            print(f'{self.n_baskets} baskets counted, {len(self.keys) + self._buffered} pair keys')
+
+        if carry is not None and not carry.empty:
+            self.add(carry[order_column], carry[product_column])
+
+    def result(self, min_count: int = 1, with_lift: bool = False) -> pd.DataFrame:
+        """Pairs seen in at least `min_count` baskets, normalized (product1 <= product2).
+
+        With `with_lift`, adds lift = P(a, b) / (P(a) P(b)) and pmi = ln(lift).
+        """
+        self._compact()
+        keep = self.counts >= min_count
+        keys, counts = self.keys[keep], self.counts[keep]
+        first, second = keys >> _CODE_BITS, keys & _CODE_MASK
+
+        names = self.products.to_numpy()
+        df = pd.DataFrame({"product1": names[first], "product2": names[second], "cooccurrence_count": counts})
+        if with_lift:
+            lift = counts * self.n_baskets / (self.item_counts[first] * self.item_counts[second])
+            df["lift"] = lift
+            df["pmi"] = np.log(lift)
+        return normalize_pairs(df)
@@ -0,0 +1,52 @@
+import os
+from sqlalchemy import text
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# max neighbours precomputed per product (upper bound of the co-occurrence tools `limit`)
+COOCCURRENCE_MAX_NEIGHBOURS = int(os.environ.get("COOCCURRENCE_MAX_NEIGHBOURS", 50))
+
+
+###############################################################################
+# Co-occurrence adjacency (precomputed top-k neighbours)
+###############################################################################
+
+def build_product_neighbours(session, max_neighbours: int = COOCCURRENCE_MAX_NEIGHBOURS):
+    """Rebuilds `dbo.product_neighbours` from `dbo.cooccurrences`.
+
+    Name pairs are resolved to product IDs, expanded to both directions and ranked per product,
+    keeping the `max_neighbours` strongest ones. Runs as a single set-based statement.
+    """
+    session.execute(text("TRUNCATE dbo.product_neighbours"))
+    session.execute(
+        text("""
+            INSERT INTO dbo.product_neighbours (product_id, rank, neighbour_id, cooccurrence_count)
+            SELECT product_id, rank, neighbour_id, cooccurrence_count
+            FROM (
+                SELECT
+                    product_id,
+                    neighbour_id,
+                    cooccurrence_count,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY product_id
+                        ORDER BY cooccurrence_count DESC, neighbour_id
+                    ) AS rank
+                FROM (
+                    SELECT p1.id AS product_id, p2.id AS neighbour_id, c.cooccurrence_count
+                    FROM dbo.cooccurrences c
+                    JOIN dbo.products p1 ON p1.name = c.product1
+                    JOIN dbo.products p2 ON p2.name = c.product2
+                    UNION ALL
+                    SELECT p2.id, p1.id, c.cooccurrence_count
+                    FROM dbo.cooccurrences c
+                    JOIN dbo.products p1 ON p1.name = c.product1
+                    JOIN dbo.products p2 ON p2.name = c.product2
+                ) AS pairs
+                WHERE product_id <> neighbour_id
+            ) AS ranked
+            WHERE rank <= :max_neighbours
+        """),
+        {"max_neighbours": max_neighbours}
+    )
+    session.execute(text("ANALYZE dbo.product_neighbours"))
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Date, UniqueConstraint
+from sqlalchemy import Column, Integer, BigInteger, Float, String, Text, Date, DateTime, UniqueConstraint, Index, ForeignKey, func
 from sqlalchemy.orm import declarative_base
 from pgvector.sqlalchemy import Vector
 from sqlalchemy import MetaData
@@ -24,6 +24,20 @@ class Product(Base):
     tokens = Column(Integer)
     embedding = Column(Vector(1536))
 
+    __table_args__ = (
+        # stable key of the catalog upserts (see db/catalog_loader.py)
+        Index('ix_products_name', 'name', unique=True),
+        # structured search filters (see db/product_search.py)
+        Index('ix_products_type', 'type'),
+        Index('ix_products_category', 'category'),
+        Index('ix_products_major_category', 'major_category'),
+        Index('ix_products_franchise', 'franchise'),
+        Index('ix_products_min_age', 'min_age'),
+        Index('ix_products_store_a', 'store_a'),
+        Index('ix_products_store_b', 'store_b'),
+        Index('ix_products_store_c', 'store_c'),
+    )
+
 
 class ProductCooccurrences(Base):
     __tablename__ = 'cooccurrences'
@@ -32,8 +46,46 @@ class ProductCooccurrences(Base):
     product1 = Column(Text, nullable=False)
     product2 = Column(Text, nullable=False)
     cooccurrence_count = Column(Integer, nullable=False)
+    # association strength, only when built from baskets (see db/cooccurrence_builder.py)
+    lift = Column(Float)
+    pmi = Column(Float)
 
     # Ensure uniqueness and avoid duplicated relationships
     __table_args__ = (
         UniqueConstraint('product1', 'product2', name='uq_product_pair'),
-    )
\ No newline at end of file
+    )
+
+
+class ProductNeighbours(Base):
+    __tablename__ = 'product_neighbours'
+
+    # symmetric, ID-based adjacency list derived from dbo.cooccurrences:
+    # each pair is stored in both directions, neighbours ranked by cooccurrence_count (1 = strongest),
+    # so the top-k neighbours of a product are one primary key range scan
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    rank = Column(Integer, primary_key=True)
+    neighbour_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
+    cooccurrence_count = Column(Integer, nullable=False)
+
+
+class ProductSimilarity(Base):
+    __tablename__ = 'similar_products'
+
+    # materialized item-to-item lists blending embedding similarity and co-occurrence strength
+    # (see db/item_similarity.py), ranked per product (1 = most similar): top-k is a primary key range scan.
+    # similar_id has no foreign key, so the incremental refresh can find lists pointing to deleted products
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    rank = Column(Integer, primary_key=True)
+    similar_id = Column(Integer, nullable=False)
+    score = Column(Float, nullable=False)
+    embedding_similarity = Column(Float, nullable=False)
+    cooccurrence_strength = Column(Float, nullable=False)
+
+
+class CatalogVersion(Base):
+    __tablename__ = 'catalog_versions'
+
+    # one row per catalog table, bumped by triggers on every write (see db/catalog_version.py)
+    table_name = Column(Text, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
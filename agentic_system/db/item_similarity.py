@@ -0,0 +1,177 @@
+import os
+from sqlalchemy import text
+from dotenv import load_dotenv
+
+from agentic_system.db.vector_index import (
+    DISTANCE_OPERATOR, HNSW_EF_SEARCH, IVFFLAT_PROBES, VECTOR_INDEX_TYPE, set_search_params, ivfflat_probes_for,
+)
+
+load_dotenv()
+
+# score = embedding weight * embedding similarity + co-occurrence weight * co-occurrence strength
+SIMILARITY_EMBEDDING_WEIGHT = float(os.environ.get("SIMILARITY_EMBEDDING_WEIGHT", 0.6))
+SIMILARITY_COOCCURRENCE_WEIGHT = float(os.environ.get("SIMILARITY_COOCCURRENCE_WEIGHT", 0.4))
+# products kept per list (upper bound of the similar products tool `limit`)
+SIMILAR_PRODUCTS_MAX = int(os.environ.get("SIMILAR_PRODUCTS_MAX", 20))
+# nearest embedding neighbours scored per product, on top of its co-occurrence neighbours
+SIMILARITY_CANDIDATES = int(os.environ.get("SIMILARITY_CANDIDATES", 50))
+# above this fraction of affected products, the incremental refresh rebuilds every list
+SIMILARITY_FULL_REFRESH_FRACTION = float(os.environ.get("SIMILARITY_FULL_REFRESH_FRACTION", 0.2))
+
+
+###############################################################################
+# Materialized item-to-item lists
+###############################################################################
+
+def _build_lists(session, product_ids: list[int] | None = None):
+    """Inserts the ranked lists of `product_ids` (all products if None) into `dbo.similar_products`.
+
+    Candidates are the product's nearest embedding neighbours (ANN index scan per product) and
+    its precomputed co-occurrence neighbours. Embedding similarity is the inner product of the
+    unit-normalized embeddings, co-occurrence strength the pair count relative to the product's
+    strongest pair, both in [0, 1].
+    """
+    where = "WHERE id = ANY(:product_ids)" if product_ids is not None else ""
+    params = {
+        "candidates": SIMILARITY_CANDIDATES,
+        "max_similar": SIMILAR_PRODUCTS_MAX,
+        "w_embedding": SIMILARITY_EMBEDDING_WEIGHT,
+        "w_cooccurrence": SIMILARITY_COOCCURRENCE_WEIGHT,
+    }
+    if product_ids is not None:
+        params["product_ids"] = list(product_ids)
+
+    # the ANN scan of each product returns at most ef_search rows (HNSW) or the rows of the probed lists (IVFFlat)
+    set_search_params(
+        session,
+        ef_search=max(HNSW_EF_SEARCH, SIMILARITY_CANDIDATES),
+        probes=ivfflat_probes_for(session, SIMILARITY_CANDIDATES) if VECTOR_INDEX_TYPE == "ivfflat" else IVFFLAT_PROBES,
+    )
+    session.execute(text(f"""
+        WITH source AS (
+            SELECT id, embedding FROM dbo.products {where}
+        ),
+        candidates AS (
+            SELECT s.id AS product_id, e.id AS similar_id
+            FROM source s
+            CROSS JOIN LATERAL (
+                SELECT q.id FROM dbo.products q
+                WHERE q.id <> s.id AND q.embedding IS NOT NULL
+                ORDER BY q.embedding {DISTANCE_OPERATOR} s.embedding
+                LIMIT :candidates
+            ) AS e
+            WHERE s.embedding IS NOT NULL
+            UNION
+            SELECT n.product_id, n.neighbour_id
+            FROM dbo.product_neighbours n
+            JOIN source s ON s.id = n.product_id
+        ),
+        scored AS (
+            SELECT
+                c.product_id,
+                c.similar_id,
+                coalesce(-(p.embedding {DISTANCE_OPERATOR} q.embedding), 0) AS embedding_similarity,
+                coalesce(n.cooccurrence_count::float / nullif(m.max_count, 0), 0) AS cooccurrence_strength
+            FROM candidates c
+            JOIN dbo.products p ON p.id = c.product_id
+            JOIN dbo.products q ON q.id = c.similar_id
+            LEFT JOIN dbo.product_neighbours n ON n.product_id = c.product_id AND n.neighbour_id = c.similar_id
+            LEFT JOIN (
+                SELECT product_id, max(cooccurrence_count) AS max_count
+                FROM dbo.product_neighbours
+                GROUP BY product_id
+            ) AS m ON m.product_id = c.product_id
+        ),
+        ranked AS (
+            SELECT
+                *,
+                ROW_NUMBER() OVER (PARTITION BY product_id ORDER BY score DESC, similar_id) AS rank
+            FROM (
+                SELECT *, :w_embedding * embedding_similarity + :w_cooccurrence * cooccurrence_strength AS score
+                FROM scored
+            ) AS blended
+        )
+        INSERT INTO dbo.similar_products (product_id, rank, similar_id, score, embedding_similarity, cooccurrence_strength)
+        SELECT product_id, rank, similar_id, score, embedding_similarity, cooccurrence_strength
+        FROM ranked
+        WHERE rank <= :max_similar
+    """), params)
+
+
+def build_similar_products(session):
+    """Rebuilds `dbo.similar_products` for every product."""
+    session.execute(text("TRUNCATE dbo.similar_products"))
+    _build_lists(session)
+    session.execute(text("ANALYZE dbo.similar_products"))
+
+
+def affected_products(session, changed_names: set[str]) -> list[int]:
+    """IDs of the products whose list can change when `changed_names` were upserted or deleted.
+
+    That is the changed products themselves, the products whose list holds a changed or deleted
+    product, their co-occurrence partners, and every product whose list is not full or whose
+    weakest entry scores below the embedding part of its similarity to a changed product.
+    """
+    return session.execute(
+        text(f"""
+            WITH changed AS (
+                SELECT id, embedding FROM dbo.products WHERE name = ANY(:names)
+            ),
+            lists AS (
+                SELECT product_id, min(score) AS min_score, count(*) AS n
+                FROM dbo.similar_products
+                GROUP BY product_id
+            )
+            SELECT id FROM changed
+            UNION
+            SELECT s.product_id FROM dbo.similar_products s
+            WHERE s.similar_id IN (SELECT id FROM changed)
+                OR NOT EXISTS (SELECT 1 FROM dbo.products p WHERE p.id = s.similar_id)
+            UNION
+            SELECT n.product_id FROM dbo.product_neighbours n
+            WHERE n.neighbour_id IN (SELECT id FROM changed)
+            UNION
+            SELECT y.id
+            FROM dbo.products y
+            CROSS JOIN changed x
+            LEFT JOIN lists l ON l.product_id = y.id
+            WHERE y.id <> x.id AND (
+                l.product_id IS NULL
+                OR l.n < :max_similar
+                OR :w_embedding * -(x.embedding {DISTANCE_OPERATOR} y.embedding) > l.min_score
+            )
+        """),
+        {
+            "names": list(changed_names),
+            "max_similar": SIMILAR_PRODUCTS_MAX,
+            "w_embedding": SIMILARITY_EMBEDDING_WEIGHT,
+        }
+    ).scalars().all()
+
+
+def refresh_similar_products(session, changed_names: set[str] | None = None):
+    """Recomputes the lists affected by `changed_names` (product names), or all of them if None.
+
+    Falls back to a full rebuild when the table is empty or too many lists are affected.
+    """
+    empty = not session.execute(text("SELECT EXISTS (SELECT 1 FROM dbo.similar_products)")).scalar()
+    if changed_names is None or empty:
+        build_similar_products(session)
+        return
+
+    # affected products are a superset of the changed ones: a large ingest rebuilds everything
+    # without first comparing every changed product with every product
+    n_products = session.execute(text("SELECT count(*) FROM dbo.products")).scalar()
+    max_affected = SIMILARITY_FULL_REFRESH_FRACTION * max(n_products, 1)
+    if len(changed_names) > max_affected:
+        build_similar_products(session)
+        return
+
+    product_ids = affected_products(session, changed_names)
+    if len(product_ids) > max_affected:
+        build_similar_products(session)
+        return
+
+    # lists of deleted products cascade, lists pointing to them are in `product_ids`
+    session.execute(text("DELETE FROM dbo.similar_products WHERE product_id = ANY(:ids)"), {"ids": product_ids})
+    _build_lists(session, product_ids)
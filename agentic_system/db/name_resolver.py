@@ -0,0 +1,170 @@
+import os
+import re
+import json
+import threading
+import unicodedata
+import numpy as np
+from functools import lru_cache
+from dotenv import load_dotenv
+
+from agentic_system.db.catalog_snapshot import catalog_snapshot
+from agentic_system.utils.tracing import debug_print
+
+load_dotenv()
+
+# min trigram similarity (Dice coefficient) to accept a fuzzy match, below it the name is kept as is
+PRODUCT_NAME_MIN_SIMILARITY = float(os.environ.get("PRODUCT_NAME_MIN_SIMILARITY", 0.6))
+# min similarity gap between the best and the second best product, closer matches are ambiguous
+PRODUCT_NAME_MIN_MARGIN = float(os.environ.get("PRODUCT_NAME_MIN_MARGIN", 0.25))
+# resolved names cached per catalog version
+PRODUCT_NAME_CACHE_SIZE = int(os.environ.get("PRODUCT_NAME_CACHE_SIZE", 4096))
+# optional JSON file {"alias": "catalog product name"} with extra exact aliases
+PRODUCT_ALIASES_PATH = os.environ.get("PRODUCT_ALIASES_PATH")
+
+# phrases users (and the LLM) add to or abbreviate in catalog names, rewritten before matching
+PHRASE_ALIASES = {
+    "the legend of zelda": "zelda",
+    "legend of zelda": "zelda",
+    "botw": "zelda breath of the wild",
+    "totk": "zelda tears of the kingdom",
+    "mk8": "mario kart 8",
+    "mk8d": "mario kart 8 deluxe",
+    "acnh": "animal crossing new horizons",
+    "joycon": "joy con",
+    "for nintendo switch": "",
+    "for switch": "",
+}
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+NUMBER_PATTERN = re.compile(r"\b\d+\b")
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase words without accents and punctuation, with the phrase aliases applied."""
+    name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode().lower()
+    name = " ".join(WORD_PATTERN.findall(name))
+    for phrase, replacement in PHRASE_ALIASES.items():
+        name = re.sub(rf"\b{re.escape(phrase)}\b", replacement, name)
+    return " ".join(name.split())
+
+
+def trigrams(normalized: str) -> set[str]:
+    """Character trigrams of each word, padded like pg_trgm ("  w", " wo", ..., "rd ")."""
+    grams = set()
+    for word in normalized.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def numbers(normalized: str) -> frozenset[str]:
+    """Number tokens of a name (sequel/edition numbers: "splatoon 2" vs "splatoon 3")."""
+    return frozenset(NUMBER_PATTERN.findall(normalized))
+
+
+###############################################################################
+# Name resolution index
+###############################################################################
+
+class NameIndex:
+    """Immutable name index of one catalog version, with its own cache of resolved names.
+
+    Exact matches (normalized name or alias) are one dict lookup. Other names are scored against
+    every product through a trigram inverted index (posting lists of product positions, counted
+    with `np.bincount`). The best Dice similarity is accepted only if it is above `min_similarity`,
+    at least `min_margin` above the second best product (otherwise ambiguous) and the product
+    name holds every number of the requested name.
+    """
+
+    def __init__(self, version: tuple[int, ...], names: list[str], exact: dict[str, str],
+                 min_similarity: float, min_margin: float):
+        self.version = version
+        self.names = names
+        self.exact = exact
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+
+        postings = {}
+        normalized = [normalize_name(name) for name in names]
+        grams = [trigrams(n) for n in normalized]
+        for position, product_grams in enumerate(grams):
+            for gram in product_grams:
+                postings.setdefault(gram, []).append(position)
+        self.postings = {gram: np.asarray(positions, dtype=np.int32) for gram, positions in postings.items()}
+        self.sizes = np.asarray([len(g) for g in grams], dtype=np.float64)
+        self.numbers = [numbers(n) for n in normalized]
+
+        self.resolve = lru_cache(maxsize=PRODUCT_NAME_CACHE_SIZE)(self._resolve)
+
+    def _resolve(self, name: str) -> str | None:
+        normalized = normalize_name(name)
+        if normalized in self.exact:
+            return self.exact[normalized]
+
+        query = trigrams(normalized)
+        hits = [self.postings[gram] for gram in query if gram in self.postings]
+        if not hits:
+            return None
+
+        shared = np.bincount(np.concatenate(hits), minlength=len(self.names))
+        similarity = 2 * shared / (self.sizes + len(query))
+        ranked = np.argsort(-similarity)[:2]
+        best = int(ranked[0])
+        if similarity[best] < self.min_similarity:
+            return None
+        if len(ranked) > 1 and similarity[best] - similarity[ranked[1]] < self.min_margin:
+            return None
+        if not numbers(normalized) <= self.numbers[best]:
+            return None
+        return self.names[best]
+
+
+class ProductNameResolver:
+    """Maps free-form product names to canonical `dbo.products.name` values, in memory.
+
+    The index (see `NameIndex`) is built from the in-memory catalog snapshot, rebuilt when its
+    version changes and published with a single assignment, so readers never mix two versions.
+    """
+
+    def __init__(self, min_similarity: float = PRODUCT_NAME_MIN_SIMILARITY, min_margin: float = PRODUCT_NAME_MIN_MARGIN,
+                 aliases_path: str | None = PRODUCT_ALIASES_PATH):
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.aliases_path = aliases_path
+        self._lock = threading.Lock()
+        self._index = None
+
+    def _ensure_loaded(self) -> NameIndex:
+        catalog = catalog_snapshot.get()
+        index = self._index
+        if index is not None and index.version == catalog.version:
+            return index
+
+        with self._lock:
+            if self._index is not None and self._index.version == catalog.version:
+                return self._index
+
+            names = catalog.names.tolist()
+            exact = {normalize_name(name): name for name in names}
+            if self.aliases_path and os.path.exists(self.aliases_path):
+                with open(self.aliases_path, "r", encoding="utf-8") as f:
+                    exact.update({normalize_name(alias): name for alias, name in json.load(f).items() if name in catalog.id_by_name})
+
+            self._index = NameIndex(catalog.version, names, exact, self.min_similarity, self.min_margin)
+            debug_print(f"Indexed {len(names)} product names (catalog version {catalog.version})")
+            return self._index
+
+    def resolve(self, name: str) -> str | None:
+        """Canonical product name for `name`, None if no product is a clear enough match."""
+        return self._ensure_loaded().resolve(name)
+
+
+name_resolver = ProductNameResolver()
+
+
+def resolve_product_name(name: str) -> str:
+    """Canonical product name, or `name` unchanged when it cannot be resolved."""
+    resolved = name_resolver.resolve(name)
+    if resolved is not None and resolved != name:
+        debug_print(f"Resolved product name '{name}' -> '{resolved}'")
+    return resolved or name
@@ -0,0 +1,328 @@
+import os
+import glob
+import json
+import asyncio
+import threading
+import numpy as np
+from datetime import date
+from functools import lru_cache
+from typing_extensions import TypedDict
+from sqlalchemy import select, text
+from dotenv import load_dotenv
+
+from agentic_system.db.db_conn import session_scope, async_session_scope
+from agentic_system.db.db_schemas import Product
+from agentic_system.db.catalog_version import CatalogVersionWatcher
+from agentic_system.db.vector_index import DISTANCE_OPERATOR, set_search_params, aset_search_params
+from agentic_system.utils.tracing import debug_print
+
+load_dotenv()
+
+# "pgvector" (query Postgres on every search) or "numpy" (in-process matrix search)
+PRODUCT_SEARCH_BACKEND = os.environ.get("PRODUCT_SEARCH_BACKEND", "pgvector").lower()
+# storage dtype of the in-process matrix: "float32" or "float16" (half the memory, slightly less precise)
+PRODUCT_SEARCH_DTYPE = os.environ.get("PRODUCT_SEARCH_DTYPE", "float32")
+PRODUCT_SEARCH_DIR = os.environ.get("PRODUCT_SEARCH_DIR", os.path.join(".cache", "product_search"))
+
+# columns returned by every backend
+PRODUCT_COLUMNS = [
+    "name", "release_date", "times_sold", "store_a", "store_b", "store_c",
+    "type", "category", "franchise", "min_age", "major_category",
+]
+
+
+###############################################################################
+# Structured filters
+###############################################################################
+
+class ProductFilters(TypedDict, total=False):
+    """Optional structured constraints applied together with the vector ordering."""
+    stores: list[str]               # sold at any of these stores ("A", "B", "C")
+    max_age: int                    # suitable for this age (min_age <= max_age, products without age rating included)
+    types: list[str]
+    categories: list[str]
+    major_categories: list[str]
+    franchises: list[str]
+    exclude_franchises: list[str]
+    exclude_names: list[str]
+
+
+STORE_COLUMNS = {"A": "store_a", "B": "store_b", "C": "store_c"}
+
+
+def build_filter_clause(filters: ProductFilters | None) -> tuple[str, dict]:
+    """Translates filters into a SQL WHERE clause (bind parameters only, columns whitelisted)."""
+    if not filters:
+        return "", {}
+
+    conditions, params = [], {}
+
+    stores = [STORE_COLUMNS[store.upper()] for store in filters.get("stores") or [] if store.upper() in STORE_COLUMNS]
+    if stores:
+        conditions.append("(" + " OR ".join(f"{column} > 0" for column in stores) + ")")
+    if filters.get("max_age") is not None:
+        conditions.append("(min_age IS NULL OR min_age <= :max_age)")
+        params["max_age"] = int(filters["max_age"])
+    for key, column in (("types", "type"), ("categories", "category"),
+                        ("major_categories", "major_category"), ("franchises", "franchise")):
+        if filters.get(key):
+            conditions.append(f"{column} = ANY(:{key})")
+            params[key] = list(filters[key])
+    if filters.get("exclude_franchises"):
+        conditions.append("(franchise IS NULL OR franchise <> ALL(:exclude_franchises))")
+        params["exclude_franchises"] = list(filters["exclude_franchises"])
+    if filters.get("exclude_names"):
+        conditions.append("name <> ALL(:exclude_names)")
+        params["exclude_names"] = list(filters["exclude_names"])
+
+    if not conditions:
+        return "", {}
+    return "WHERE " + " AND ".join(conditions), params
+
+
+###############################################################################
+# Backends
+###############################################################################
+
+class PgvectorSearchBackend:
+    """Nearest-neighbour search executed by Postgres (pgvector) on every call."""
+
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def _statement(where: str):
+        """One statement object per filter combination, so compiled SQL and prepared statements are reused."""
+        if where:
+            # an ANN index scan only returns its ef_search/probes candidates before filtering,
+            # which can leave fewer than k rows. Filter first (btree indexes on the filter columns)
+            # and rank the matching rows exactly instead.
+            return text(f"""
+                WITH candidates AS MATERIALIZED (
+                    SELECT {", ".join(PRODUCT_COLUMNS)}, embedding
+                    FROM dbo.products
+                    {where}
+                )
+                SELECT {", ".join(PRODUCT_COLUMNS)}
+                FROM candidates
+                ORDER BY embedding {DISTANCE_OPERATOR} :embedding_vector ASC
+                LIMIT :k
+            """).execution_options(trace_name="product_search_filtered")
+        return text(f"""
+            SELECT {", ".join(PRODUCT_COLUMNS)}
+            FROM dbo.products
+            ORDER BY embedding {DISTANCE_OPERATOR} :embedding_vector ASC
+            LIMIT :k
+        """).execution_options(trace_name="product_search")
+
+    def search(self, embedding: list, k: int = 10, filters: ProductFilters | None = None) -> list[dict]:
+        where, params = build_filter_clause(filters)
+        sql = self._statement(where)
+
+        with session_scope() as session:
+            set_search_params(session)
+            results = session.execute(
+                sql,
+                {"embedding_vector": str(list(embedding)), "k": k, **params}
+            ).mappings().all()
+
+        return [dict(r) for r in results]
+
+    async def asearch(self, embedding: list, k: int = 10, filters: ProductFilters | None = None) -> list[dict]:
+        """Same as `search` on the async engine, the query vector is sent in binary format."""
+        where, params = build_filter_clause(filters)
+        sql = self._statement(where)
+
+        async with async_session_scope() as session:
+            await aset_search_params(session)
+            results = (await session.execute(
+                sql,
+                {"embedding_vector": np.asarray(embedding, dtype=np.float32), "k": k, **params}
+            )).mappings().all()
+
+        return [dict(r) for r in results]
+
+    def search_batch(self, embeddings: list[list], k: int = 10, filters: ProductFilters | None = None) -> list[list[dict]]:
+        return [self.search(embedding, k, filters) for embedding in embeddings]
+
+
+class NumpySearchBackend:
+    """Exact in-process nearest-neighbour search over a memory-mapped embedding matrix.
+
+    All product embeddings are kept in one contiguous (n_products, dim) matrix, memory-mapped
+    from a file under `PRODUCT_SEARCH_DIR`. A query is one matrix-vector product followed by
+    `argpartition`, ranking by inner product like the pgvector `<#>` operator.
+
+    The snapshot is tagged with the catalog version of `dbo.products` and reloaded when it changes.
+    """
+
+    # rows per block when the stored matrix is float16 (upcast block by block for BLAS speed)
+    BLOCK_ROWS = 65536
+
+    def __init__(self, directory: str = PRODUCT_SEARCH_DIR, dtype: str = PRODUCT_SEARCH_DTYPE):
+        self.directory = directory
+        self.dtype = np.dtype(dtype)
+        self.watcher = CatalogVersionWatcher(tables=("products",))
+        self._lock = threading.Lock()
+        # (version, matrix, rows, columns), replaced with a single assignment on reload
+        # so a reader never combines the matrix of one version with the rows of another
+        self._state = None
+
+    def _paths(self, version: tuple[int, ...]) -> tuple[str, str]:
+        tag = "_".join(str(v) for v in version)
+        base = os.path.join(self.directory, f"products_v{tag}_{self.dtype.name}")
+        return f"{base}.npy", f"{base}.json"
+
+    def _ensure_loaded(self) -> tuple:
+        version = self.watcher.current()
+        state = self._state
+        if state is not None and state[0] == version:
+            return state
+
+        with self._lock:
+            if self._state is not None and self._state[0] == version:
+                return self._state
+
+            matrix_path, rows_path = self._paths(version)
+            if not (os.path.exists(matrix_path) and os.path.exists(rows_path)):
+                self._export(matrix_path, rows_path)
+
+            with open(rows_path, "r", encoding="utf-8") as f:
+                rows = json.load(f)
+            for row in rows:
+                if row["release_date"] is not None:
+                    row["release_date"] = date.fromisoformat(row["release_date"])
+            matrix = np.load(matrix_path, mmap_mode="r")
+            # columnar copies of the attributes, used to evaluate filters with vectorized masks
+            columns = {column: np.array([row[column] for row in rows], dtype=object) for column in PRODUCT_COLUMNS}
+
+            self._state = (version, matrix, rows, columns)
+            debug_print(f"Loaded {len(rows)} product embeddings for in-process search (catalog version {version})")
+            self._remove_stale((matrix_path, rows_path))
+            return self._state
+
+    def _remove_stale(self, current: tuple[str, str]):
+        """Deletes the snapshot files of other catalog versions.
+
+        Unlinked files stay readable through the mmaps of readers still holding an older state.
+        """
+        pattern = os.path.join(self.directory, f"products_v*_{self.dtype.name}")
+        for path in glob.glob(pattern + ".npy") + glob.glob(pattern + ".json"):
+            if path in current:
+                continue
+            try:
+                os.remove(path)
+                debug_print(f"Removed stale product search snapshot {path}")
+            except OSError as e:
+                debug_print(f"Could not remove stale product search snapshot {path}: {e}")
+
+    def snapshot(self) -> tuple[np.ndarray, list[dict], dict]:
+        """Current (matrix, rows, columns) of one catalog version, reloaded first if the catalog changed."""
+        _, matrix, rows, columns = self._ensure_loaded()
+        return matrix, rows, columns
+
+    def _export(self, matrix_path: str, rows_path: str):
+        """Dumps product rows and embeddings from Postgres into the on-disk snapshot."""
+        os.makedirs(self.directory, exist_ok=True)
+
+        columns = [getattr(Product, column) for column in PRODUCT_COLUMNS]
+        with session_scope() as session:
+            results = session.execute(
+                select(*columns, Product.embedding)
+                .where(Product.embedding.is_not(None))
+                .order_by(Product.id)
+            ).all()
+
+        rows = [
+            {column: (value.isoformat() if isinstance(value, date) else value)
+             for column, value in zip(PRODUCT_COLUMNS, result[:-1])}
+            for result in results
+        ]
+        matrix = np.asarray([result[-1] for result in results], dtype=self.dtype)
+
+        # write to temporary names first so concurrent readers never see partial files
+        np.save(matrix_path + ".tmp.npy", matrix)
+        os.replace(matrix_path + ".tmp.npy", matrix_path)
+        with open(rows_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False)
+        os.replace(rows_path + ".tmp", rows_path)
+
+    def _scores(self, matrix: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """Inner products between every product and every query, shape (n_products, n_queries)."""
+        if matrix.dtype == np.float32:
+            return matrix @ queries.T
+
+        return np.concatenate([
+            matrix[start:start + self.BLOCK_ROWS].astype(np.float32) @ queries.T
+            for start in range(0, len(matrix), self.BLOCK_ROWS)
+        ])
+
+    @staticmethod
+    def _mask(columns: dict, filters: ProductFilters | None) -> np.ndarray | None:
+        """Boolean mask of the products matching `filters` (same semantics as the SQL filters)."""
+        if not filters:
+            return None
+
+        mask = np.ones(len(columns["name"]), dtype=bool)
+
+        def positive(column):
+            return np.array([value is not None and value > 0 for value in columns[column]], dtype=bool)
+
+        stores = [STORE_COLUMNS[store.upper()] for store in filters.get("stores") or [] if store.upper() in STORE_COLUMNS]
+        if stores:
+            mask &= np.logical_or.reduce([positive(column) for column in stores])
+        if filters.get("max_age") is not None:
+            max_age = int(filters["max_age"])
+            mask &= np.array([value is None or value <= max_age for value in columns["min_age"]], dtype=bool)
+        for key, column in (("types", "type"), ("categories", "category"),
+                            ("major_categories", "major_category"), ("franchises", "franchise")):
+            if filters.get(key):
+                mask &= np.isin(columns[column], list(filters[key]))
+        if filters.get("exclude_franchises"):
+            mask &= ~np.isin(columns["franchise"], list(filters["exclude_franchises"]))
+        if filters.get("exclude_names"):
+            mask &= ~np.isin(columns["name"], list(filters["exclude_names"]))
+
+        return mask
+
+    def search_batch(self, embeddings: list[list], k: int = 10, filters: ProductFilters | None = None) -> list[list[dict]]:
+        matrix, rows, columns = self.snapshot()
+        if len(rows) == 0:
+            return [[] for _ in embeddings]
+
+        queries = np.asarray(embeddings, dtype=np.float32)
+        scores = self._scores(matrix, queries)
+
+        mask = self._mask(columns, filters)
+        n_candidates = len(rows)
+        if mask is not None:
+            scores[~mask, :] = -np.inf
+            n_candidates = int(mask.sum())
+
+        k = min(k, n_candidates)
+        if k == 0:
+            return [[] for _ in embeddings]
+
+        results = []
+        for q in range(queries.shape[0]):
+            column = scores[:, q]
+            top = np.argpartition(-column, k - 1)[:k]
+            top = top[np.argsort(-column[top])]
+            results.append([dict(rows[i]) for i in top])
+
+        return results
+
+    def search(self, embedding: list, k: int = 10, filters: ProductFilters | None = None) -> list[dict]:
+        return self.search_batch([embedding], k, filters)[0]
+
+    async def asearch(self, embedding: list, k: int = 10, filters: ProductFilters | None = None) -> list[dict]:
+        # snapshot (re)loads and version checks are blocking, keep them off the event loop
+        return await asyncio.to_thread(self.search, embedding, k, filters)
+
+
+@lru_cache(maxsize=1)
+def get_search_backend():
+    """Process-wide product search backend selected by PRODUCT_SEARCH_BACKEND."""
+    if PRODUCT_SEARCH_BACKEND == "numpy":
+        return NumpySearchBackend()
+    if PRODUCT_SEARCH_BACKEND == "pgvector":
+        return PgvectorSearchBackend()
+    raise ValueError(f"Unknown PRODUCT_SEARCH_BACKEND '{PRODUCT_SEARCH_BACKEND}', expected 'pgvector' or 'numpy'")
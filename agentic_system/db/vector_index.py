@@ -0,0 +1,113 @@
+import os
+import math
+from sqlalchemy import text
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+###############################################################################
+# Vector index configuration
+###############################################################################
+
+# OpenAI embeddings are unit-normalized, so negative inner product ranks exactly like cosine
+# distance and is the cheapest to compute. The query operator and the index operator class
+# must always match, otherwise Postgres silently falls back to a sequential scan.
+DISTANCE_OPERATOR = "<#>"
+INDEX_OPS = "vector_ip_ops"
+
+# "hnsw" (default), "ivfflat" or "none"
+VECTOR_INDEX_TYPE = os.environ.get("VECTOR_INDEX_TYPE", "hnsw").lower()
+
+# build parameters
+HNSW_M = int(os.environ.get("HNSW_M", 16))
+HNSW_EF_CONSTRUCTION = int(os.environ.get("HNSW_EF_CONSTRUCTION", 64))
+IVFFLAT_LISTS = os.environ.get("IVFFLAT_LISTS")  # default derived from the row count
+
+# query-time parameters (recall/latency trade-off)
+HNSW_EF_SEARCH = int(os.environ.get("HNSW_EF_SEARCH", 40))
+IVFFLAT_PROBES = int(os.environ.get("IVFFLAT_PROBES", 10))
+
+
+def index_name(table: str) -> str:
+    return f"ix_{table}_embedding_ann"
+
+
+def ivfflat_lists_for(n_rows: int) -> int:
+    """pgvector guideline: rows / 1000 up to 1M rows, sqrt(rows) above."""
+    if IVFFLAT_LISTS:
+        return int(IVFFLAT_LISTS)
+    if n_rows <= 1_000_000:
+        return max(1, n_rows // 1000)
+    return int(math.sqrt(n_rows))
+
+
+def create_vector_index(conn, table: str = "products", schema: str = "dbo", column: str = "embedding",
+                        index_type: str = VECTOR_INDEX_TYPE):
+    """(Re)creates the ANN index on `schema.table(column)`.
+
+    IVFFlat clusters are computed from the rows present at build time, so it must be
+    (re)built after loading data. HNSW can be built at any time and stays valid on inserts.
+
+    Parameters
+    ----------
+    conn : sqlalchemy Connection or Session
+    index_type : str
+        "hnsw", "ivfflat" or "none" (drop the index and rely on exact search).
+    """
+    name = index_name(table)
+    conn.execute(text(f"DROP INDEX IF EXISTS {schema}.{name}"))
+
+    if index_type == "none":
+        return
+
+    if index_type == "hnsw":
+        conn.execute(text(f"""
+            CREATE INDEX {name} ON {schema}.{table}
+            USING hnsw ({column} {INDEX_OPS})
+            WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION})
+        """))
+    elif index_type == "ivfflat":
+        n_rows = conn.execute(text(f"SELECT count(*) FROM {schema}.{table}")).scalar()
+        conn.execute(text(f"""
+            CREATE INDEX {name} ON {schema}.{table}
+            USING ivfflat ({column} {INDEX_OPS})
+            WITH (lists = {ivfflat_lists_for(n_rows)})
+        """))
+    else:
+        raise ValueError(f"Unknown vector index type '{index_type}', expected 'hnsw', 'ivfflat' or 'none'")
+
+    conn.execute(text(f"ANALYZE {schema}.{table}"))
+
+
+def ivfflat_probes_for(session, k: int, table: str = "products", schema: str = "dbo") -> int:
+    """IVFFlat probes for scans that must return `k` rows: the probed lists hold about 4 * k rows
+    on average (lists are unevenly sized), never fewer probes than IVFFLAT_PROBES.
+    """
+    n_rows = session.execute(text(f"SELECT count(*) FROM {schema}.{table}")).scalar() or 0
+    # lists of the existing index, it may have been built for a different row count
+    options = session.execute(
+        text("SELECT reloptions FROM pg_class WHERE relname = :name"), {"name": index_name(table)}
+    ).scalar() or []
+    lists = next((int(o.split("=", 1)[1]) for o in options if o.startswith("lists=")), ivfflat_lists_for(n_rows))
+
+    rows_per_list = max(1.0, n_rows / max(1, lists))
+    return min(lists, max(IVFFLAT_PROBES, math.ceil(4 * k / rows_per_list)))
+
+
+def set_search_params(session, index_type: str = VECTOR_INDEX_TYPE,
+                      ef_search: int = HNSW_EF_SEARCH, probes: int = IVFFLAT_PROBES):
+    """Applies query-time ANN tuning for the current transaction only (SET LOCAL)."""
+    if index_type == "hnsw":
+        session.execute(text(f"SET LOCAL hnsw.ef_search = {int(ef_search)}"))
+    elif index_type == "ivfflat":
+        session.execute(text(f"SET LOCAL ivfflat.probes = {int(probes)}"))
+
+
+async def aset_search_params(session, index_type: str = VECTOR_INDEX_TYPE,
+                             ef_search: int = HNSW_EF_SEARCH, probes: int = IVFFLAT_PROBES):
+    """Async counterpart of `set_search_params` (AsyncSession)."""
+    if index_type == "hnsw":
+        await session.execute(text(f"SET LOCAL hnsw.ef_search = {int(ef_search)}"))
+    elif index_type == "ivfflat":
+        await session.execute(text(f"SET LOCAL ivfflat.probes = {int(probes)}"))
@@ -0,0 +1,197 @@
+import os
+import time
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from langgraph.checkpoint.memory import InMemorySaver
+from dotenv import load_dotenv
+
+from agentic_system.utils.tracing import debug_print
+
+load_dotenv()
+
+# conversation threads (sessions) kept in memory, least recently used ones are evicted first
+CHECKPOINT_MAX_THREADS = int(os.environ.get("CHECKPOINT_MAX_THREADS", 1000))
+# idle threads older than this (seconds) are dropped, from memory and from the SQLite file
+CHECKPOINT_TTL_S = float(os.environ.get("CHECKPOINT_TTL_S", 3600))
+# latest checkpoints kept per thread and namespace (older ones are only needed for time travel)
+CHECKPOINT_KEEP_PER_THREAD = int(os.environ.get("CHECKPOINT_KEEP_PER_THREAD", 2))
+# optional SQLite file: threads are written through and reloaded after eviction or a restart
+CHECKPOINT_SQLITE_PATH = os.environ.get("CHECKPOINT_SQLITE_PATH") or None
+# seconds between two sweeps of expired threads from the SQLite file
+CHECKPOINT_SWEEP_INTERVAL_S = float(os.environ.get("CHECKPOINT_SWEEP_INTERVAL_S", 60))
+
+
+###############################################################################
+# Bounded checkpointer
+###############################################################################
+
+class BoundedCheckpointSaver(InMemorySaver):
+    """In-memory LangGraph checkpointer with bounded size.
+
+    - Only the latest `keep_per_thread` checkpoints of each thread are kept (with their writes
+      and the channel values they reference), so a long conversation holds one state, not all of them.
+    - Threads idle for more than `ttl_s` seconds are dropped and at most `max_threads` threads are
+      kept in memory (least recently used evicted first).
+    - With `sqlite_path`, every checkpoint of a thread is written through to SQLite and evicted
+      threads are reloaded from it on their next access, so sessions survive evictions and restarts.
+
+    Async methods of `InMemorySaver` call the sync ones, so both paths are bounded.
+    """
+
+    def __init__(self, max_threads: int = CHECKPOINT_MAX_THREADS, ttl_s: float = CHECKPOINT_TTL_S,
+                 keep_per_thread: int = CHECKPOINT_KEEP_PER_THREAD, sqlite_path: str | None = CHECKPOINT_SQLITE_PATH):
+        super().__init__()
+        self.max_threads = max_threads
+        self.ttl_s = ttl_s
+        self.keep_per_thread = max(1, keep_per_thread)
+        self._access = OrderedDict()  # thread_id -> last access time, least recent first
+        self._lock = threading.RLock()
+        self._last_sweep = time.time()
+        self.evictions = 0
+
+        self._conn = None
+        if sqlite_path:
+            os.makedirs(os.path.dirname(os.path.abspath(sqlite_path)), exist_ok=True)
+            self._conn = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS threads (
+                    thread_id TEXT PRIMARY KEY,
+                    state BLOB NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_threads_last_access ON threads(last_access)")
+            self._conn.commit()
+
+    # -- LangGraph checkpointer interface ------------------------------------
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            if thread_id not in self.storage:
+                self._restore(thread_id)
+            result = super().get_tuple(config)
+            self._touch(thread_id)
+            return result
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            result = super().put(config, checkpoint, metadata, new_versions)
+            self._prune(thread_id, config["configurable"].get("checkpoint_ns", ""))
+            self._persist(thread_id)
+            self._touch(thread_id)
+            return result
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        with self._lock:
+            super().put_writes(config, writes, task_id, task_path)
+            self._touch(config["configurable"]["thread_id"])
+
+    def delete_thread(self, thread_id: str):
+        with self._lock:
+            super().delete_thread(thread_id)
+            self._access.pop(thread_id, None)
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM threads WHERE thread_id = ?", (thread_id,))
+                self._conn.commit()
+
+    # -- bookkeeping ---------------------------------------------------------
+
+    def _touch(self, thread_id: str):
+        self._access[thread_id] = time.time()
+        self._access.move_to_end(thread_id)
+        self._evict()
+
+    def _evict(self):
+        now = time.time()
+        while self._access:
+            thread_id, last_access = next(iter(self._access.items()))
+            expired = now - last_access > self.ttl_s
+            if not expired and len(self._access) <= self.max_threads:
+                break
+            if expired:
+                self.delete_thread(thread_id)
+            else:
+                # still a live session: dropped from memory only, SQLite keeps it
+                super().delete_thread(thread_id)
+                self._access.pop(thread_id)
+            self.evictions += 1
+
+        # expired rows are never restored (see `_restore`), so the file is only swept from time to time
+        if self._conn is not None and now - self._last_sweep >= CHECKPOINT_SWEEP_INTERVAL_S:
+            self._conn.execute("DELETE FROM threads WHERE last_access < ?", (now - self.ttl_s,))
+            self._conn.commit()
+            self._last_sweep = now
+
+    def _prune(self, thread_id: str, checkpoint_ns: str):
+        """Drops all but the latest checkpoints of a thread namespace, with their writes and unreferenced blobs."""
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if len(checkpoints) <= self.keep_per_thread:
+            return
+
+        # checkpoint ids are time-ordered (uuid6)
+        ordered = sorted(checkpoints, reverse=True)
+        for checkpoint_id in ordered[self.keep_per_thread:]:
+            del checkpoints[checkpoint_id]
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+
+        referenced = set()
+        for checkpoint_id in ordered[:self.keep_per_thread]:
+            checkpoint = self.serde.loads_typed(checkpoints[checkpoint_id][0])
+            referenced.update(checkpoint["channel_versions"].items())
+        for key in [k for k in self.blobs if k[0] == thread_id and k[1] == checkpoint_ns]:
+            if (key[2], key[3]) not in referenced:
+                del self.blobs[key]
+
+    def _thread_state(self, thread_id: str) -> dict:
+        return {
+            "storage": {ns: dict(checkpoints) for ns, checkpoints in self.storage[thread_id].items()},
+            "writes": {k: v for k, v in self.writes.items() if k[0] == thread_id},
+            "blobs": {k: v for k, v in self.blobs.items() if k[0] == thread_id},
+        }
+
+    def _persist(self, thread_id: str):
+        if self._conn is None:
+            return
+        self._conn.execute(
+            "INSERT OR REPLACE INTO threads (thread_id, state, last_access) VALUES (?, ?, ?)",
+            (thread_id, pickle.dumps(self._thread_state(thread_id)), time.time()),
+        )
+        self._conn.commit()
+
+    def _restore(self, thread_id: str):
+        if self._conn is None:
+            return
+        row = self._conn.execute(
+            "SELECT state FROM threads WHERE thread_id = ? AND last_access >= ?",
+            (thread_id, time.time() - self.ttl_s),
+        ).fetchone()
+        if row is None:
+            return
+        # written by `_persist` of this application only
+        state = pickle.loads(row[0])
+        for ns, checkpoints in state["storage"].items():
+            self.storage[thread_id][ns].update(checkpoints)
+        self.writes.update(state["writes"])
+        self.blobs.update(state["blobs"])
+        debug_print(f"Restored conversation thread {thread_id} from {CHECKPOINT_SQLITE_PATH}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "threads_in_memory": len(self._access),
+                "checkpoints": sum(len(c) for namespaces in self.storage.values() for c in namespaces.values()),
+                "blobs": len(self.blobs),
+                "evictions": self.evictions,
+            }
+
+
+@lru_cache(maxsize=1)
+def get_checkpointer() -> BoundedCheckpointSaver:
+    """Process-wide checkpointer of the conversation graph."""
+    return BoundedCheckpointSaver()
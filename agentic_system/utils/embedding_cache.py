@@ -0,0 +1,140 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+
+
+###############################################################################
+# Embedding Cache
+###############################################################################
+
+def normalize_text(text: str) -> str:
+    """Normalizes text so that trivially different queries share the same cache entry."""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def cache_key(model: str, text: str) -> str:
+    """Content-addressed key for an embedding: hash of (model, normalized text)."""
+    return hashlib.sha256(f"{model}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Two-tier (in-memory LRU + on-disk SQLite) cache of embedding vectors.
+
+    Vectors are stored on disk as raw float32 blobs. The memory tier is bounded by number of
+    entries, the disk tier by total blob size (least recently used rows are evicted first).
+
+    Parameters
+    ----------
+    path : str | None
+        SQLite file for the disk tier. If None, only the in-memory tier is used.
+    max_memory_items : int
+        Max number of vectors kept in the in-memory LRU.
+    max_disk_bytes : int
+        Max total size of the stored vectors in the disk tier.
+    """
+
+    def __init__(self, path: str | None, max_memory_items: int = 1024, max_disk_bytes: int = 256 * 1024 * 1024):
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._conn = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    tokens INTEGER,
+                    vector BLOB NOT NULL,
+                    nbytes INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_last_access ON embeddings(last_access)")
+            self._conn.commit()
+            self._disk_bytes = self._conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM embeddings").fetchone()[0]
+
+    def get(self, model: str, text: str) -> tuple[int, list] | None:
+        key = cache_key(model, text)
+
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key]
+
+            if self._conn is not None:
+                row = self._conn.execute("SELECT tokens, vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._conn.execute("UPDATE embeddings SET last_access = ? WHERE key = ?", (time.time(), key))
+                    self._conn.commit()
+                    value = (row[0], array("f", row[1]).tolist())
+                    self._remember(key, value)
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def put(self, model: str, text: str, tokens: int, embedding: list):
+        key = cache_key(model, text)
+        value = (tokens, embedding)
+
+        with self._lock:
+            self._remember(key, value)
+
+            if self._conn is not None:
+                blob = array("f", embedding).tobytes()
+                previous = self._conn.execute("SELECT nbytes FROM embeddings WHERE key = ?", (key,)).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, tokens, vector, nbytes, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (key, tokens, blob, len(blob), time.time()),
+                )
+                self._disk_bytes += len(blob) - (previous[0] if previous else 0)
+                self._evict_disk()
+                self._conn.commit()
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "memory_items": len(self._memory),
+            "disk_bytes": self._disk_bytes if self._conn is not None else 0,
+        }
+
+    def _remember(self, key: str, value: tuple[int, list]):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        while self._disk_bytes > self.max_disk_bytes:
+            rows = self._conn.execute(
+                "SELECT key, nbytes FROM embeddings ORDER BY last_access ASC LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for key, nbytes in rows:
+                if self._disk_bytes <= self.max_disk_bytes:
+                    break
+                self._conn.execute("DELETE FROM embeddings WHERE key = ?", (key,))
+                self._disk_bytes -= nbytes
+                self.evictions += 1
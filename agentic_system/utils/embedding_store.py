@@ -0,0 +1,76 @@
+import os
+import json
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# storage dtype of the sidecar matrix: "float32" or "float16" (half the size, slightly less precise)
+EMBEDDING_STORE_DTYPE = os.environ.get("EMBEDDING_STORE_DTYPE", "float32")
+
+
+###############################################################################
+# Binary embedding store
+###############################################################################
+
+class EmbeddingStore:
+    """Product embeddings of one embedding model, stored next to the catalog metadata.
+
+    <directory>/<model>.npy        (n_products, dim) matrix, memory-mapped on load (no parsing, no copy)
+    <directory>/<model>.keys.json  one entry per matrix row: product name, text hash and token count
+
+    Rows are keyed by product name (the stable product key of the catalog) and by the hash of the
+    text they were computed from, so an edited text is never served a stale embedding.
+    """
+
+    def __init__(self, directory: str, model: str, dtype: str = EMBEDDING_STORE_DTYPE):
+        self.directory = directory
+        self.model = model
+        self.dtype = np.dtype(dtype)
+        self.matrix = None
+        self.keys = []
+        self._rows = {}
+
+    @property
+    def matrix_path(self) -> str:
+        return os.path.join(self.directory, f"{self.model}.npy")
+
+    @property
+    def keys_path(self) -> str:
+        return os.path.join(self.directory, f"{self.model}.keys.json")
+
+    def load(self) -> "EmbeddingStore":
+        if os.path.exists(self.matrix_path) and os.path.exists(self.keys_path):
+            self.matrix = np.load(self.matrix_path, mmap_mode="r")
+            with open(self.keys_path, "r", encoding="utf-8") as f:
+                self.keys = json.load(f)
+            self._rows = {key["name"]: i for i, key in enumerate(self.keys)}
+        return self
+
+    def get(self, name: str, text_hash: str) -> tuple[int, np.ndarray] | None:
+        """(tokens, embedding row view) of `name` if it was computed from the text with `text_hash`."""
+        row = self._rows.get(name)
+        if row is None or self.keys[row]["text_hash"] != text_hash:
+            return None
+        return self.keys[row]["tokens"], self.matrix[row]
+
+    def entries(self) -> dict[str, tuple[str, int, np.ndarray]]:
+        """All stored rows as {name: (text_hash, tokens, embedding row view)}."""
+        return {key["name"]: (key["text_hash"], key["tokens"], self.matrix[i]) for i, key in enumerate(self.keys)}
+
+    def save(self, entries: dict[str, tuple[str, int, np.ndarray]]):
+        """Replaces the store with `entries` ({name: (text_hash, tokens, embedding)}), atomically."""
+        os.makedirs(self.directory, exist_ok=True)
+        names = list(entries)
+        matrix = np.asarray([entries[name][2] for name in names], dtype=self.dtype)
+        keys = [{"name": name, "text_hash": entries[name][0], "tokens": entries[name][1]} for name in names]
+
+        # write to temporary names first so readers never see a matrix and keys that do not match
+        np.save(self.matrix_path + ".tmp.npy", matrix)
+        with open(self.keys_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(keys, f, ensure_ascii=False, indent=1)
+        os.replace(self.matrix_path + ".tmp.npy", self.matrix_path)
+        os.replace(self.keys_path + ".tmp", self.keys_path)
+
+        self.matrix, self.keys = np.load(self.matrix_path, mmap_mode="r"), keys
+        self._rows = {key["name"]: i for i, key in enumerate(keys)}
@@ -2,6 +2,10 @@ import os
 from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv
 
+from agentic_system.utils.openai_client import (
+    OPENAI_BASE_URL, OPENAI_MAX_RETRIES, OPENAI_TIMEOUT_S, get_http_client, get_async_http_client,
+)
+
 load_dotenv()
 
 # LLM Definitions
@@ -9,14 +13,25 @@ load_dotenv()
 tool_llm = ChatOpenAI(
     model=os.environ["OPENAI_TOOL_MODEL"],
     api_key=os.environ["OPENAPI_KEY"],
+    base_url=OPENAI_BASE_URL,
     max_tokens=1000,
     temperature=0,
+    # both LLMs share the embedding calls' connection pool and rate limit budget
+    http_client=get_http_client(),
+    http_async_client=get_async_http_client(),
+    max_retries=OPENAI_MAX_RETRIES,
+    timeout=OPENAI_TIMEOUT_S,
 )
 
 # llm for inference (2nd connection)
 infer_llm = ChatOpenAI(
     model=os.environ["OPENAI_INFER_MODEL"],
     api_key=os.environ["OPENAPI_KEY"],
+    base_url=OPENAI_BASE_URL,
     max_tokens=1000,
     temperature=0.2,
+    http_client=get_http_client(),
+    http_async_client=get_async_http_client(),
+    max_retries=OPENAI_MAX_RETRIES,
+    timeout=OPENAI_TIMEOUT_S,
 )
\ No newline at end of file
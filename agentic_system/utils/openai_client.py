@@ -0,0 +1,337 @@
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import Future
+from functools import lru_cache
+import httpx
+from openai import OpenAI
+from dotenv import load_dotenv
+
+from agentic_system.utils.tracing import metrics
+
+load_dotenv()
+
+# optional OpenAI compatible endpoint (e.g. the local stand-in of benchmarks/fake_openai.py)
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL") or None
+# connections to the API shared by every chat and embedding call, kept alive between calls
+OPENAI_MAX_CONNECTIONS = int(os.environ.get("OPENAI_MAX_CONNECTIONS", 32))
+OPENAI_KEEPALIVE_S = float(os.environ.get("OPENAI_KEEPALIVE_S", 60))
+OPENAI_TIMEOUT_S = float(os.environ.get("OPENAI_TIMEOUT_S", 60))
+# account rate limits (requests and tokens per minute, chat and embeddings together), 0 = not enforced
+OPENAI_RPM_LIMIT = int(os.environ.get("OPENAI_RPM_LIMIT", 0))
+OPENAI_TPM_LIMIT = int(os.environ.get("OPENAI_TPM_LIMIT", 0))
+# retries of 429/5xx/connection errors (exponential backoff by the SDK) plus a random delay per retry
+OPENAI_MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", 4))
+OPENAI_RETRY_JITTER_S = float(os.environ.get("OPENAI_RETRY_JITTER_S", 1.0))
+# identical non-streaming requests in flight at the same time share one HTTP call
+OPENAI_COALESCE_REQUESTS = os.environ.get("OPENAI_COALESCE_REQUESTS", "true").lower() in ("1", "true", "yes")
+
+# endpoints counted against the rate limits
+SCHEDULED_PATHS = ("/chat/completions", "/embeddings")
+
+
+###############################################################################
+# Rate limit scheduler
+###############################################################################
+
+class TokenBucket:
+    """Budget of `per_minute` units, refilled continuously.
+
+    Reservations may take the level below zero: the caller waits until the debt is refilled,
+    so concurrent callers are spaced out in arrival order instead of all retrying at once.
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Takes `amount` units, returns the seconds to wait before using them."""
+        self._refill(now)
+        # a request larger than the bucket only waits for a full bucket
+        self.level -= min(amount, self.capacity)
+        return max(0.0, -self.level / self.rate)
+
+    def drain(self, seconds: float, now: float):
+        """Nothing is available for the next `seconds` (e.g. after a 429)."""
+        self._refill(now)
+        self.level = min(self.level, -seconds * self.rate)
+
+
+class RequestScheduler:
+    """Requests-per-minute and tokens-per-minute buckets shared by every API call of the process."""
+
+    def __init__(self, rpm_limit: int = OPENAI_RPM_LIMIT, tpm_limit: int = OPENAI_TPM_LIMIT):
+        self._lock = threading.Lock()
+        self.requests = TokenBucket(rpm_limit) if rpm_limit > 0 else None
+        self.tokens = TokenBucket(tpm_limit) if tpm_limit > 0 else None
+        self.blocked_until = 0.0
+
+    def reserve(self, tokens: int) -> float:
+        """Seconds to wait before sending a request of about `tokens` tokens."""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self.blocked_until - now)
+            if self.requests is not None:
+                wait = max(wait, self.requests.reserve(1, now))
+            if self.tokens is not None:
+                wait = max(wait, self.tokens.reserve(tokens, now))
+            return wait
+
+    def backoff(self, seconds: float):
+        """Holds every new request for `seconds`, after the API answered 429."""
+        with self._lock:
+            now = time.monotonic()
+            self.blocked_until = max(self.blocked_until, now + seconds)
+            for bucket in (self.requests, self.tokens):
+                if bucket is not None:
+                    bucket.drain(seconds, now)
+
+
+def _retry_after(response: httpx.Response) -> float:
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        return float(headers.get("retry-after", 1.0))
+    except ValueError:
+        return 1.0
+
+
+###############################################################################
+# Scheduling transports
+###############################################################################
+
+class _RequestPlan:
+    """What the transport does with a request: rate limit it (path), how much, and its coalescing key."""
+
+    def __init__(self, request: httpx.Request, coalesce: bool):
+        self.path = next((p for p in SCHEDULED_PATHS if request.url.path.endswith(p)), None)
+        self.tokens, self.key, self.retry = 0, None, False
+        if self.path is None:
+            return
+
+        content = request.content
+        body = json.loads(content) if content else {}
+        # ~4 bytes of JSON per prompt token, plus the completion budget (counted by the API at request time)
+        self.tokens = len(content) // 4 + (body.get("max_tokens") or body.get("max_completion_tokens") or 0)
+        self.retry = int(request.headers.get("x-stainless-retry-count", 0)) > 0
+        if coalesce and not body.get("stream"):
+            self.key = hashlib.sha256(request.url.raw_path + content).hexdigest()
+
+    def delay(self, scheduler: RequestScheduler) -> float:
+        wait = scheduler.reserve(self.tokens)
+        if self.retry:
+            # spreads the retries of requests rejected together
+            wait += random.uniform(0, OPENAI_RETRY_JITTER_S)
+        if wait > 0:
+            metrics.observe("rate_limit_wait", self.path, wait * 1000)
+        return wait
+
+    def after(self, scheduler: RequestScheduler, response: httpx.Response):
+        if response.status_code == 429:
+            metrics.inc("throttled", "openai", self.path)
+            scheduler.backoff(_retry_after(response))
+
+
+def _response(parts: tuple, request: httpx.Request) -> httpx.Response:
+    """New response object (one per caller) from the shared (status, headers, raw body)."""
+    status_code, headers, content = parts
+    return httpx.Response(status_code, headers=headers, content=content, request=request)
+
+
+class SchedulingTransport(httpx.BaseTransport):
+    """Sync transport: rate limits API calls and coalesces identical in-flight requests."""
+
+    def __init__(self, transport: httpx.BaseTransport, scheduler: RequestScheduler, coalesce: bool = OPENAI_COALESCE_REQUESTS):
+        self.transport = transport
+        self.scheduler = scheduler
+        self.coalesce = coalesce
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def _send(self, request: httpx.Request, plan: _RequestPlan) -> httpx.Response:
+        wait = plan.delay(self.scheduler)
+        if wait > 0:
+            time.sleep(wait)
+        response = self.transport.handle_request(request)
+        plan.after(self.scheduler, response)
+        return response
+
+    def _fetch(self, request: httpx.Request, plan: _RequestPlan) -> tuple:
+        response = self._send(request, plan)
+        try:
+            # raw (still encoded) body, each caller's response decodes its own copy
+            return response.status_code, response.headers.multi_items(), b"".join(response.stream)
+        finally:
+            response.close()
+
+    def _release(self, key: str, future: Future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        plan = _RequestPlan(request, self.coalesce)
+        if plan.path is None or plan.key is None:
+            return self.transport.handle_request(request) if plan.path is None else self._send(request, plan)
+
+        while True:
+            with self._lock:
+                future = self._inflight.get(plan.key)
+                leader = future is None
+                if leader:
+                    future = self._inflight[plan.key] = Future()
+            if leader:
+                break
+            parts = future.result()
+            if parts is not None:
+                metrics.inc("coalesced", "openai", plan.path)
+                return _response(parts, request)
+            # the leader was interrupted (not a failed request): send it again, possibly as the new leader
+
+        try:
+            parts = self._fetch(request, plan)
+        except Exception as e:
+            self._release(plan.key, future)
+            future.set_exception(e)
+            raise
+        except BaseException:
+            # KeyboardInterrupt, SystemExit...: only the leader's own call is aborted
+            self._release(plan.key, future)
+            future.set_result(None)
+            raise
+        self._release(plan.key, future)
+        future.set_result(parts)
+        return _response(parts, request)
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncSchedulingTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of `SchedulingTransport` (requests are coalesced per event loop)."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, scheduler: RequestScheduler, coalesce: bool = OPENAI_COALESCE_REQUESTS):
+        self.transport = transport
+        self.scheduler = scheduler
+        self.coalesce = coalesce
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._waiters = {}
+
+    async def _send(self, request: httpx.Request, plan: _RequestPlan) -> httpx.Response:
+        wait = plan.delay(self.scheduler)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        response = await self.transport.handle_async_request(request)
+        plan.after(self.scheduler, response)
+        return response
+
+    async def _fetch(self, request: httpx.Request, plan: _RequestPlan) -> tuple:
+        response = await self._send(request, plan)
+        try:
+            return response.status_code, response.headers.multi_items(), b"".join([chunk async for chunk in response.stream])
+        finally:
+            await response.aclose()
+
+    def _release(self, key: tuple, task: asyncio.Task):
+        with self._lock:
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+                self._waiters.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # retrieved by the waiting callers, if any
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        plan = _RequestPlan(request, self.coalesce)
+        if plan.path is None:
+            return await self.transport.handle_async_request(request)
+        if plan.key is None:
+            return await self._send(request, plan)
+
+        loop = asyncio.get_running_loop()
+        key = (id(loop), plan.key)
+        with self._lock:
+            task = self._inflight.get(key)
+            if task is None:
+                # the call runs in its own task: cancelling the caller that started it
+                # (client disconnect, timeout) does not cancel it for the other callers
+                task = self._inflight[key] = loop.create_task(self._fetch(request, plan))
+                task.add_done_callback(lambda done: self._release(key, done))
+            else:
+                metrics.inc("coalesced", "openai", plan.path)
+            self._waiters[key] = self._waiters.get(key, 0) + 1
+
+        try:
+            parts = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            abandoned = False
+            with self._lock:
+                if self._inflight.get(key) is task:
+                    self._waiters[key] -= 1
+                    abandoned = self._waiters[key] == 0
+                    if abandoned:
+                        # detached first: a caller arriving now starts a new call
+                        del self._inflight[key]
+                        del self._waiters[key]
+            if abandoned:
+                task.cancel()  # nobody waits for the response anymore
+            raise
+        return _response(parts, request)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+###############################################################################
+# Shared clients
+###############################################################################
+
+@lru_cache(maxsize=1)
+def get_scheduler() -> RequestScheduler:
+    return RequestScheduler()
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+        keepalive_expiry=OPENAI_KEEPALIVE_S,
+    )
+
+
+@lru_cache(maxsize=1)
+def get_http_client() -> httpx.Client:
+    """Process-wide sync HTTP client of the OpenAI API (keep-alive pool, rate limits, coalescing)."""
+    transport = SchedulingTransport(httpx.HTTPTransport(limits=_limits()), get_scheduler())
+    return httpx.Client(transport=transport, timeout=OPENAI_TIMEOUT_S)
+
+
+@lru_cache(maxsize=1)
+def get_async_http_client() -> httpx.AsyncClient:
+    """Process-wide async HTTP client, sharing the rate limit budget of `get_http_client`."""
+    transport = AsyncSchedulingTransport(httpx.AsyncHTTPTransport(limits=_limits()), get_scheduler())
+    return httpx.AsyncClient(transport=transport, timeout=OPENAI_TIMEOUT_S)
+
+
+@lru_cache(maxsize=1)
+def get_openai_client() -> OpenAI:
+    """Process-wide OpenAI client, so every call reuses the same HTTP connection pool."""
+    return OpenAI(
+        api_key=os.environ["OPENAPI_KEY"],
+        base_url=OPENAI_BASE_URL,
+        http_client=get_http_client(),
+        max_retries=OPENAI_MAX_RETRIES,
+        timeout=OPENAI_TIMEOUT_S,
+    )
@@ -0,0 +1,254 @@
+import os
+import re
+import json
+import threading
+from collections import defaultdict
+from dotenv import load_dotenv
+from langchain_core.callbacks import BaseCallbackHandler
+
+from agentic_system.utils.utils import count_tokens, truncate_tokens
+from agentic_system.utils.tracing import debug_print
+
+load_dotenv()
+
+# max tokens of queried data forwarded from the querying agent to the recommendation agent
+PAYLOAD_TOKEN_BUDGET = int(os.environ.get("PAYLOAD_TOKEN_BUDGET", 1500))
+# max tokens of earlier conversation turns sent with an LLM call (the current turn is always sent)
+MESSAGE_TOKEN_CAP = int(os.environ.get("MESSAGE_TOKEN_CAP", 3000))
+
+# product fields used by the recommendation prompt (stores are merged into a single column)
+PRODUCT_FIELDS = ["name", "type", "category", "franchise", "release_date", "min_age", "times_sold"]
+STORE_FIELDS = {"store_a": "A", "store_b": "B", "store_c": "C"}
+
+
+###############################################################################
+# Compact payload between querying and recommendation agents
+###############################################################################
+
+def _cell(value) -> str:
+    return "" if value is None else str(value).replace("|", "/")
+
+
+def _stores(product: dict) -> str:
+    return ",".join(store for field, store in STORE_FIELDS.items() if (product.get(field) or 0) > 0)
+
+
+def _group_rows(group) -> list:
+    """Rows of a co-occurrence group: a list of rows or a {"resolved_name", "cooccurrences"} dict."""
+    if isinstance(group, dict):
+        group = group.get("cooccurrences")
+    return group if isinstance(group, list) else []
+
+
+def _cooccurrence_rows(cooccurrences: list) -> list[tuple]:
+    """Flattens [{product: group}] into unique (product, bought_with, count) rows, strongest first.
+
+    product is the resolved catalog name (product1 of each row), not the name the LLM asked for.
+    """
+    rows, seen = [], set()
+    for group in cooccurrences:
+        if isinstance(group, dict) and "product1" in group:
+            candidates = [group]
+        elif isinstance(group, dict) and "cooccurrences" in group:
+            candidates = _group_rows(group)
+        elif isinstance(group, dict):
+            candidates = [row for value in group.values() for row in _group_rows(value)]
+        else:
+            continue
+
+        for row in candidates:
+            if not isinstance(row, dict) or "product1" not in row:
+                continue
+            pair = tuple(sorted((row["product1"], row["product2"])))
+            if pair in seen:
+                continue
+            seen.add(pair)
+            rows.append((row["product1"], row["product2"], row.get("cooccurrence_count")))
+    return sorted(rows, key=lambda r: r[2] or 0, reverse=True)
+
+
+def compact_payload(payload: dict, token_budget: int = PAYLOAD_TOKEN_BUDGET, model: str | None = None) -> str:
+    """Serializes a {"products", "cooccurrences"} payload as compact pipe-separated tables.
+
+    Products are deduplicated by name and reduced to the fields the recommendation prompt uses.
+    Rows are kept in rank order (search rank for products, count for co-occurrences), alternating
+    between both tables, until `token_budget` is reached; the rest is dropped.
+    """
+    model = model or os.environ["OPENAI_INFER_MODEL"]
+
+    products, seen = [], set()
+    for product in payload.get("products") or []:
+        if isinstance(product, dict) and product.get("name") not in seen:
+            seen.add(product.get("name"))
+            products.append(product)
+
+    product_lines = [
+        "|".join([_cell(p.get(field)) for field in PRODUCT_FIELDS] + [_stores(p)])
+        for p in products
+    ]
+    cooccurrence_lines = [
+        "|".join(_cell(v) for v in row) for row in _cooccurrence_rows(payload.get("cooccurrences") or [])
+    ]
+
+    product_header = "products: " + "|".join(PRODUCT_FIELDS + ["stores"])
+    cooccurrence_header = "bought_together: product|bought_with|count"
+    used = count_tokens(product_header, model) + count_tokens(cooccurrence_header, model)
+
+    kept = {"products": [], "cooccurrences": []}
+    queues = [("products", product_lines), ("cooccurrences", cooccurrence_lines)]
+    positions = {"products": 0, "cooccurrences": 0}
+    while True:
+        progressed = False
+        for key, lines in queues:
+            if positions[key] >= len(lines):
+                continue
+            line = lines[positions[key]]
+            cost = count_tokens(line, model) + 1
+            if used + cost > token_budget:
+                positions[key] = len(lines)  # budget exhausted for this table
+                continue
+            kept[key].append(line)
+            positions[key] += 1
+            used += cost
+            progressed = True
+        if not progressed:
+            break
+
+    dropped = len(product_lines) - len(kept["products"]) + len(cooccurrence_lines) - len(kept["cooccurrences"])
+    sections = [product_header, *kept["products"], cooccurrence_header, *kept["cooccurrences"]]
+    if dropped:
+        sections.append(f"({dropped} lower ranked rows omitted)")
+    return "\n".join(sections)
+
+
+def _parse_agent_json(output: str):
+    """The JSON object in an agent answer, which is often wrapped in ```json fences or prose. None if there is none."""
+    output = re.sub(r"```(?:json)?", "", output)
+    start, end = output.find("{"), output.rfind("}")
+    if start == -1 or end < start:
+        return None
+    try:
+        return json.loads(output[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+
+
+def compact_querying_output(output, token_budget: int = PAYLOAD_TOKEN_BUDGET, model: str | None = None) -> str:
+    """Compacts the querying agent output, which is a payload dict or (agent mode) a JSON string."""
+    if isinstance(output, str):
+        parsed = _parse_agent_json(output)
+        if parsed is None:
+            # not the expected JSON, forwarded as text but still within the budget
+            debug_print("Querying output is not JSON, truncated to the payload budget")
+            return truncate_tokens(output, token_budget, model or os.environ["OPENAI_INFER_MODEL"])
+        output = parsed
+    if not isinstance(output, dict):
+        return json.dumps(output, ensure_ascii=False, default=str)
+    return compact_payload(output, token_budget)
+
+
+def routing_view(messages: list) -> list:
+    """Messages as seen by the supervisor: queried data is replaced by a one-line placeholder.
+
+    The supervisor only routes, it does not need the data rows resent on every hop.
+    """
+    view = []
+    for message in messages:
+        if getattr(message, "name", None) == "querying_node":
+            n_lines = len(str(message.content).splitlines())
+            message = message.model_copy(update={"content": f"[queried data available: {n_lines} lines]"})
+        view.append(message)
+    return view
+
+
+###############################################################################
+# Conversation window
+###############################################################################
+
+def _role(message) -> str:
+    if isinstance(message, dict):
+        return message.get("role", "")
+    if isinstance(message, tuple):
+        return message[0]
+    return {"human": "user", "ai": "assistant"}.get(message.type, message.type)
+
+
+def window_messages(messages: list, token_cap: int = MESSAGE_TOKEN_CAP, model: str | None = None) -> list:
+    """Messages to send to an LLM, with the oldest conversation turns dropped beyond `token_cap`.
+
+    Leading system messages and the current turn (from the last user message on) are always kept.
+    Earlier turns are added back newest first, whole turns only (a turn starts at a user message),
+    while they fit in `token_cap`, so a tool call is never separated from its result.
+    """
+    n_system = 0
+    while n_system < len(messages) and _role(messages[n_system]) == "system":
+        n_system += 1
+    head, body = messages[:n_system], messages[n_system:]
+
+    starts = [i for i, message in enumerate(body) if _role(message) == "user"]
+    if len(starts) <= 1:
+        return messages
+
+    kept_from, budget = starts[-1], token_cap
+    for start, end in zip(reversed(starts[:-1]), reversed(starts[1:])):
+        cost = message_tokens(body[start:end], model)
+        if cost > budget:
+            break
+        kept_from, budget = start, budget - cost
+
+    if kept_from:
+        debug_print(f"Conversation window: dropped {kept_from} of {len(body)} messages")
+    return head + body[kept_from:]
+
+
+###############################################################################
+# Per-node prompt token accounting
+###############################################################################
+
+_token_lock = threading.Lock()
+node_prompt_tokens = defaultdict(lambda: {"calls": 0, "tokens": 0})
+
+
+def message_tokens(messages: list, model: str | None = None) -> int:
+    """Approximate prompt tokens of a list of messages (dicts, tuples or langchain messages)."""
+    model = model or os.environ["OPENAI_INFER_MODEL"]
+    total = 0
+    for message in messages:
+        if isinstance(message, dict):
+            content = message.get("content", "")
+        elif isinstance(message, tuple):
+            content = message[1]
+        else:
+            content = message.content
+        total += count_tokens(content if isinstance(content, str) else str(content), model) + 4  # role/separators
+    return total
+
+
+def record_prompt_tokens(node: str, messages: list) -> int:
+    tokens = message_tokens(messages)
+    with _token_lock:
+        node_prompt_tokens[node]["calls"] += 1
+        node_prompt_tokens[node]["tokens"] += tokens
+    debug_print(f"{node} prompt tokens: {tokens}")
+    return tokens
+
+
+class PromptTokenRecorder(BaseCallbackHandler):
+    """Records the prompt tokens of every chat model call it is attached to under `node`.
+
+    For nodes whose LLM calls are made by an agent loop (one call per tool step).
+    """
+
+    run_inline = True
+
+    def __init__(self, node: str):
+        self.node = node
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        for prompt in messages:
+            record_prompt_tokens(self.node, prompt)
+
+
+def prompt_token_stats() -> dict:
+    with _token_lock:
+        return {node: dict(stats) for node, stats in node_prompt_tokens.items()}
@@ -0,0 +1,116 @@
+import os
+import time
+import threading
+import numpy as np
+from dotenv import load_dotenv
+
+from agentic_system.utils.utils import generate_embeddings
+from agentic_system.db.catalog_version import CatalogVersionWatcher
+from agentic_system.utils.tracing import debug_print
+
+load_dotenv()
+
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+# min cosine similarity between two queries to reuse an answer
+RESPONSE_CACHE_THRESHOLD = float(os.environ.get("RESPONSE_CACHE_THRESHOLD", 0.95))
+RESPONSE_CACHE_TTL_S = float(os.environ.get("RESPONSE_CACHE_TTL_S", 3600))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", 10000))
+
+
+###############################################################################
+# Semantic response cache
+###############################################################################
+
+class SemanticResponseCache:
+    """Caches final recommendation messages keyed by the embedding of the user query.
+
+    A query whose embedding is within `threshold` cosine similarity of a cached query (and younger
+    than `ttl` seconds) is answered from the cache. Entries live in a fixed-size ring buffer, so
+    a lookup is one matrix-vector product over at most `max_entries` rows.
+
+    The whole cache is dropped when `dbo.products` or `dbo.cooccurrences` change, since cached
+    answers were written from the previous data.
+    """
+
+    def __init__(self, threshold: float = RESPONSE_CACHE_THRESHOLD, ttl: float = RESPONSE_CACHE_TTL_S,
+                 max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.watcher = CatalogVersionWatcher(tables=("products", "cooccurrences"))
+        self._lock = threading.Lock()
+        self._clear()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _clear(self):
+        self._vectors = None
+        self._created = np.full(self.max_entries, -np.inf)
+        self._messages = [None] * self.max_entries
+        self._next = 0
+        self._version = None
+
+    def _check_version(self):
+        version = self.watcher.current()
+        if self._version is not None and version != self._version:
+            self._clear()
+            self.invalidations += 1
+        self._version = version
+
+    def lookup(self, user_query: str):
+        """Returns (cached message or None, query embedding, catalog version).
+
+        The embedding and the version are passed to `store` once the answer is computed.
+        """
+        _, embedding = generate_embeddings(user_query)
+        query = np.asarray(embedding, dtype=np.float32)
+
+        with self._lock:
+            self._check_version()
+
+            if self._vectors is not None:
+                similarities = self._vectors @ query
+                # expired and empty slots can never match
+                similarities[self._created < time.time() - self.ttl] = -np.inf
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self.hits += 1
+                    debug_print(f"Response cache hit (similarity {similarities[best]:.3f})")
+                    return self._messages[best], embedding, self._version
+
+            self.misses += 1
+            return None, embedding, self._version
+
+    def store(self, embedding: list, message, version: tuple[int, ...]):
+        """Caches `message`, unless the catalog changed since the `lookup` that returned `version`
+        (the answer may have been computed from the previous data)."""
+        with self._lock:
+            self._check_version()
+            if self._version != version:
+                debug_print("Catalog changed during the request, answer not cached")
+                return
+
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, len(embedding)), dtype=np.float32)
+
+            # ring buffer, the oldest entry is overwritten when full
+            slot = self._next
+            self._vectors[slot] = embedding
+            self._created[slot] = time.time()
+            self._messages[slot] = message
+            self._next = (slot + 1) % self.max_entries
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "entries": int(np.isfinite(self._created).sum()),
+        }
+
+
+response_cache = SemanticResponseCache()
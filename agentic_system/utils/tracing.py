@@ -0,0 +1,268 @@
+import os
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from langchain_core.callbacks import BaseCallbackHandler
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ad-hoc debug prints (state dumps, result sets), off by default (the CLI turns them on with --debug)
+DEBUG_PRINTS = os.environ.get("DEBUG_PRINTS", "false").lower() in ("1", "true", "yes")
+# optional JSON lines file receiving one record per finished span
+TRACE_JSONL_PATH = os.environ.get("TRACE_JSONL_PATH") or None
+
+# latency histogram buckets (milliseconds)
+LATENCY_BUCKETS_MS = [1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+
+
+def debug_print(*args, **kwargs):
+    if DEBUG_PRINTS:
+        print(*args, **kwargs)
+
+
+def set_debug_prints(enabled: bool):
+    global DEBUG_PRINTS
+    DEBUG_PRINTS = enabled
+
+
+###############################################################################
+# Metrics
+###############################################################################
+
+class Histogram:
+    """Cumulative histogram with fixed buckets, Prometheus style."""
+
+    def __init__(self, buckets: list[float] = LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile."""
+        if self.count == 0:
+            return 0.0
+        target, cumulative = q * self.count, 0
+        for bound, count in zip(self.buckets + [float("inf")], self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+    """Process-wide registry of latency histograms and counters, labelled by (kind, name)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.counters = {}
+
+    def observe(self, kind: str, name: str, duration_ms: float):
+        with self._lock:
+            self.latencies.setdefault((kind, name), Histogram()).observe(duration_ms)
+
+    def inc(self, counter: str, kind: str, name: str, value: float = 1):
+        with self._lock:
+            key = (counter, kind, name)
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def summary(self) -> dict:
+        with self._lock:
+            summary = {}
+            for (kind, name), h in sorted(self.latencies.items()):
+                summary[f"{kind}:{name}"] = {
+                    "count": h.count,
+                    "mean_ms": round(h.sum / h.count, 3) if h.count else 0.0,
+                    "p50_ms": h.quantile(0.5),
+                    "p95_ms": h.quantile(0.95),
+                    "p99_ms": h.quantile(0.99),
+                }
+            for (counter, kind, name), value in sorted(self.counters.items()):
+                summary.setdefault(f"{kind}:{name}", {})[counter] = value
+            return summary
+
+    def to_prometheus(self) -> str:
+        lines = [
+            "# HELP recommendation_span_duration_ms Wall time of nodes, tools, LLM, embedding and DB calls.",
+            "# TYPE recommendation_span_duration_ms histogram",
+        ]
+        with self._lock:
+            for (kind, name), h in sorted(self.latencies.items()):
+                labels = f'kind="{kind}",name="{name}"'
+                cumulative = 0
+                for bound, count in zip(h.buckets, h.counts):
+                    cumulative += count
+                    lines.append(f'recommendation_span_duration_ms_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'recommendation_span_duration_ms_bucket{{{labels},le="+Inf"}} {h.count}')
+                lines.append(f"recommendation_span_duration_ms_sum{{{labels}}} {h.sum}")
+                lines.append(f"recommendation_span_duration_ms_count{{{labels}}} {h.count}")
+
+            counters = sorted({counter for counter, _, _ in self.counters})
+            for counter in counters:
+                lines.append(f"# TYPE recommendation_{counter}_total counter")
+                for (c, kind, name), value in sorted(self.counters.items()):
+                    if c == counter:
+                        lines.append(f'recommendation_{counter}_total{{kind="{kind}",name="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(path + ".tmp", path)
+
+    def reset(self):
+        with self._lock:
+            self.latencies.clear()
+            self.counters.clear()
+
+
+metrics = Metrics()
+_jsonl_lock = threading.Lock()
+
+
+def record_span(kind: str, name: str, duration_ms: float, **attributes):
+    """Aggregates a finished span (and its numeric attributes as counters), optionally exports it."""
+    metrics.observe(kind, name, duration_ms)
+    for key, value in attributes.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics.inc(key, kind, name, value)
+
+    if TRACE_JSONL_PATH:
+        record = {"ts": time.time(), "kind": kind, "name": name, "duration_ms": round(duration_ms, 3), **attributes}
+        with _jsonl_lock, open(TRACE_JSONL_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+
+
+@contextmanager
+def span(kind: str, name: str, **attributes):
+    """Times a block. Attributes (rows, tokens, ...) can be added to the yielded dict."""
+    start = time.perf_counter()
+    try:
+        yield attributes
+    finally:
+        record_span(kind, name, (time.perf_counter() - start) * 1000, **attributes)
+
+
+###############################################################################
+# LangChain / LangGraph callback
+###############################################################################
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Records graph nodes, tools and LLM calls (wall time and token usage).
+
+    Attached once to the compiled graph, it is inherited by every nested run: node functions,
+    tools called by the agents and the chat model calls inside them.
+    """
+
+    def __init__(self):
+        self._starts = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, kind, name):
+        with self._lock:
+            self._starts[run_id] = (kind, name, time.perf_counter())
+
+    def _end(self, run_id, **attributes):
+        with self._lock:
+            started = self._starts.pop(run_id, None)
+        if started is not None:
+            kind, name, start = started
+            record_span(kind, name, (time.perf_counter() - start) * 1000, **attributes)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        # only the runs of the graph nodes themselves, not every internal runnable
+        # (a node given as a named runnable also starts a child run with the node name)
+        name = kwargs.get("name")
+        if metadata and name and metadata.get("langgraph_node") == name:
+            with self._lock:
+                parent = self._starts.get(parent_run_id)
+            if parent is None or parent[:2] != ("node", name):
+                self._start(run_id, "node", name)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, errors=1)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._start(run_id, "tool", (serialized or {}).get("name") or kwargs.get("name") or "tool")
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, errors=1)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        model = (metadata or {}).get("ls_model_name") or (serialized or {}).get("name") or "llm"
+        self._start(run_id, "llm", model)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        model = (metadata or {}).get("ls_model_name") or (serialized or {}).get("name") or "llm"
+        self._start(run_id, "llm", model)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        usage = {}
+        for generations in response.generations:
+            for generation in generations:
+                usage_metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage_metadata:
+                    usage["prompt_tokens"] = usage.get("prompt_tokens", 0) + usage_metadata.get("input_tokens", 0)
+                    usage["completion_tokens"] = usage.get("completion_tokens", 0) + usage_metadata.get("output_tokens", 0)
+        if not usage and response.llm_output and response.llm_output.get("token_usage"):
+            token_usage = response.llm_output["token_usage"]
+            usage = {
+                "prompt_tokens": token_usage.get("prompt_tokens", 0),
+                "completion_tokens": token_usage.get("completion_tokens", 0),
+            }
+        self._end(run_id, **usage)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, errors=1)
+
+
+tracing_callback = TracingCallbackHandler()
+
+
+###############################################################################
+# Database
+###############################################################################
+
+def install_db_tracing(engine):
+    """Times every SQL statement executed through `engine` and counts returned rows."""
+    from sqlalchemy import event
+
+    def _name(context) -> str:
+        return context.execution_options.get("trace_name") or "query"
+
+    # the start time lives on the statement's execution context, not on the pooled connection,
+    # so a failed statement cannot leave a stale start behind for the next one
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._trace_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_trace_start", None)
+        if start is None:
+            return
+        rows = cursor.rowcount if cursor.rowcount is not None and cursor.rowcount >= 0 else 0
+        record_span("db", _name(context), (time.perf_counter() - start) * 1000, rows=rows)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        context = exception_context.execution_context
+        start = getattr(context, "_trace_start", None)
+        if start is not None:
+            record_span("db", _name(context), (time.perf_counter() - start) * 1000, errors=1)
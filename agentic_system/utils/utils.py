@@ -1,26 +1,130 @@
 import os
-from openai import OpenAI
+import tiktoken
+from functools import lru_cache
+from dotenv import load_dotenv
 from langgraph.graph import MessagesState
+from langgraph.config import get_stream_writer
 from typing_extensions import TypedDict
 
+from agentic_system.utils.embedding_cache import EmbeddingCache
+from agentic_system.utils.openai_client import get_openai_client
+from agentic_system.utils.tracing import span, metrics
+
+load_dotenv()
+
 ###############################################################################
 # Utils Functions
 ###############################################################################
 
-def generate_embeddings(text:str) -> tuple[int, list]:
-    client = OpenAI(api_key=os.environ["OPENAPI_KEY"])
+# query embeddings repeat a lot (popular searches), cache them in memory and on disk
+# set EMBEDDING_CACHE_PATH="" to keep only the in-memory tier
+embedding_cache = EmbeddingCache(
+    path=os.environ.get("EMBEDDING_CACHE_PATH", os.path.join(".cache", "embeddings.sqlite")) or None,
+    max_memory_items=int(os.environ.get("EMBEDDING_CACHE_MEMORY_ITEMS", 1024)),
+    max_disk_bytes=int(os.environ.get("EMBEDDING_CACHE_MAX_MB", 256)) * 1024 * 1024,
+)
+
+
+@lru_cache(maxsize=None)
+def _token_encoding(model:str):
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # encodings are downloaded on first use, offline environments fall back to an estimate
+        print(f"Could not load tiktoken encoding for {model} ({e}), estimating token counts")
+        return None
+
+
+def count_tokens(text:str, model:str) -> int:
+    encoding = _token_encoding(model)
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text))
+
+
+def truncate_tokens(text:str, max_tokens:int, model:str) -> str:
+    """First `max_tokens` tokens of `text`."""
+    encoding = _token_encoding(model)
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text)
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+
+def generate_embeddings(text:str, use_cache:bool=True) -> tuple[int, list]:
+    model = os.environ["OPENAI_EMB_MODEL"]
+
+    if use_cache:
+        cached = embedding_cache.get(model, text)
+        if cached is not None:
+            metrics.inc("cache_hits", "embedding", model)
+            return cached
+
+    client = get_openai_client()
 
-    response = client.embeddings.create(
-        input=text,
-        model=os.environ["OPENAI_EMB_MODEL"]
-    )
+    with span("embedding", model, texts=1) as attributes:
+        response = client.embeddings.create(
+            input=text,
+            model=model
+        )
+        attributes["tokens"] = response.usage.total_tokens
 
     tokens = response.usage.total_tokens
     embedding = response.data[0].embedding
+
+    if use_cache:
+        embedding_cache.put(model, text, tokens, embedding)
     
     return tokens, embedding
 
 
+def generate_embeddings_batch(texts:list[str], use_cache:bool=True) -> list[tuple[int, list]]:
+    """Embeds many texts with a single embedding request.
+
+    Returns one (tokens, embedding) tuple per input text, in input order. The API only reports
+    total usage for the request, so per-text token counts are computed locally with tiktoken.
+    Texts already in the embedding cache are not sent.
+    """
+    model = os.environ["OPENAI_EMB_MODEL"]
+    results = [embedding_cache.get(model, text) if use_cache else None for text in texts]
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    if len(missing) < len(texts):
+        metrics.inc("cache_hits", "embedding", model, len(texts) - len(missing))
+    if missing:
+        with span("embedding", model, texts=len(missing)) as attributes:
+            response = get_openai_client().embeddings.create(
+                input=[texts[i] for i in missing],
+                model=model
+            )
+            attributes["tokens"] = response.usage.total_tokens
+
+        # response items carry the position of the input they belong to
+        for item in response.data:
+            i = missing[item.index]
+            results[i] = (count_tokens(texts[i], model), item.embedding)
+            if use_cache:
+                embedding_cache.put(model, texts[i], *results[i])
+
+    return results
+
+
+# tag of the LLM calls whose tokens are forwarded to streaming callers
+USER_FACING_TAG = "user_facing"
+
+
+def emit_progress(message:str):
+    """Sends a progress event to streaming callers (no-op outside a streamed graph run)."""
+    try:
+        writer = get_stream_writer()
+    except (RuntimeError, KeyError):
+        return
+    writer({"type": "progress", "message": message})
+
+
 ###############################################################################
 # Utils Classes
 ###############################################################################
@@ -0,0 +1,170 @@
+import os
+import csv
+import json
+import time
+import asyncio
+import argparse
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+from main import get_recommendation_graph, acall_recommendation_system
+from agentic_system.utils.tracing import metrics
+
+load_dotenv()
+
+
+###############################################################################
+# Input / Output
+###############################################################################
+
+def read_queries(input_path: str, query_field: str = "query") -> list[dict]:
+    """Reads user queries from a JSONL or CSV file.
+
+    Each record keeps an optional `id` field (if present in the input) so that results can be
+    joined back to the source, plus the `query` text.
+    """
+    records = []
+    extension = os.path.splitext(input_path)[1].lower()
+
+    with open(input_path, "r", encoding="utf-8", newline="") as f:
+        if extension == ".csv":
+            rows = csv.DictReader(f)
+        elif extension in (".jsonl", ".ndjson"):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            raise ValueError(f"Unsupported input format '{extension}', expected .jsonl or .csv")
+
+        for row in rows:
+            records.append({"id": row.get("id"), "query": row[query_field]})
+
+    return records
+
+
+class OrderedResultWriter:
+    """Writes results in input order even though they complete out of order.
+
+    Completed results are buffered until every earlier index has been written, so the
+    output file is always a valid, ordered prefix of the final result (useful on long runs).
+    """
+
+    fieldnames = ["index", "id", "query", "answer", "latency_s", "error"]
+
+    def __init__(self, output_path: str, failures_path: str):
+        self.extension = os.path.splitext(output_path)[1].lower()
+        self.output_file = open(output_path, "w", encoding="utf-8", newline="")
+        self.failures_file = open(failures_path, "w", encoding="utf-8")
+        self.csv_writer = None
+        if self.extension == ".csv":
+            self.csv_writer = csv.DictWriter(self.output_file, fieldnames=self.fieldnames)
+            self.csv_writer.writeheader()
+
+        self.pending = {}
+        self.next_index = 0
+
+    def add(self, result: dict, failure: dict | None = None):
+        if failure is not None:
+            self.failures_file.write(json.dumps(failure, ensure_ascii=False) + "\n")
+            self.failures_file.flush()
+
+        self.pending[result["index"]] = result
+        while self.next_index in self.pending:
+            self._write(self.pending.pop(self.next_index))
+            self.next_index += 1
+        self.output_file.flush()
+
+    def _write(self, result: dict):
+        if self.csv_writer is not None:
+            self.csv_writer.writerow(result)
+        else:
+            self.output_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self.output_file.close()
+        self.failures_file.close()
+
+
+###############################################################################
+# Batch execution
+###############################################################################
+
+async def run_query(index: int, record: dict, semaphore: asyncio.Semaphore, writer: OrderedResultWriter):
+    async with semaphore:
+        start = time.perf_counter()
+        answer, error, failure = None, None, None
+        try:
+            answer = (await acall_recommendation_system(record["query"])).content
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            failure = {
+                "index": index,
+                "id": record["id"],
+                "query": record["query"],
+                "error": error,
+                "traceback": traceback.format_exc(),
+            }
+        latency = time.perf_counter() - start
+
+    writer.add(
+        {
+            "index": index,
+            "id": record["id"],
+            "query": record["query"],
+            "answer": answer,
+            "latency_s": round(latency, 4),
+            "error": error,
+        },
+        failure,
+    )
+    return error is None, latency
+
+
+async def run_batch(records: list[dict], output_path: str, failures_path: str, concurrency: int):
+    # sync graph nodes run in the default executor under `ainvoke`, size it to the worker pool
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="graph")
+    )
+    get_recommendation_graph()
+
+    semaphore = asyncio.Semaphore(concurrency)
+    writer = OrderedResultWriter(output_path, failures_path)
+
+    start = time.perf_counter()
+    try:
+        outcomes = await asyncio.gather(
+            *(run_query(i, record, semaphore, writer) for i, record in enumerate(records))
+        )
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - start
+
+    n_ok = sum(ok for ok, _ in outcomes)
+    latencies = sorted(latency for _, latency in outcomes)
+    print(f"Processed {len(records)} queries in {elapsed:.1f}s ({n_ok} succeeded, {len(records) - n_ok} failed)")
+    if latencies:
+        print(
+            f"Latency p50={latencies[len(latencies) // 2]:.2f}s "
+            f"p95={latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]:.2f}s "
+            f"max={latencies[-1]:.2f}s"
+        )
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Run a file of user queries through the recommendation system")
+    parser.add_argument("input", help="JSONL or CSV file with one user query per record")
+    parser.add_argument("output", help="JSONL or CSV output file, written in input order")
+    parser.add_argument("--failures", default=None, help="JSONL file for failed queries (default: <output>.failures.jsonl)")
+    parser.add_argument("--query-field", default="query", help="Name of the field/column holding the user query")
+    parser.add_argument("--concurrency", type=int, default=int(os.environ.get("BATCH_CONCURRENCY", 8)))
+    parser.add_argument("--metrics", default=None, help="Write latency/token metrics of the run to this Prometheus text file")
+    args = parser.parse_args()
+
+    failures_path = args.failures or f"{os.path.splitext(args.output)[0]}.failures.jsonl"
+
+    records = read_queries(args.input, args.query_field)
+    asyncio.run(run_batch(records, args.output, failures_path, args.concurrency))
+
+    if args.metrics:
+        metrics.write_prometheus(args.metrics)
+        print(f"Metrics written to {args.metrics}")
@@ -0,0 +1,164 @@
+"""
+Recall/latency benchmark of pgvector ANN indexes (HNSW / IVFFlat) against exact search.
+
+Loads synthetic, clustered, unit-normalized 1536-d vectors into a scratch table (`dbo.ann_bench`)
+at several catalog sizes and compares recall@k and query latency of each index configuration
+with an exact sequential scan, using the same distance operator as `product_search_tool`.
+
+Usage:
+    python -m benchmarks.ann_benchmark --sizes 1000 10000 100000 --queries 100
+"""
+import io
+import json
+import time
+import argparse
+import numpy as np
+from sqlalchemy import text
+
+from agentic_system.db.db_conn import engine
+from agentic_system.db.vector_index import DISTANCE_OPERATOR, create_vector_index, set_search_params
+
+TABLE = "ann_bench"
+DIM = 1536
+
+
+###############################################################################
+# Data
+###############################################################################
+
+def synthetic_vectors(n: int, dim: int, n_clusters: int, rng: np.random.Generator) -> np.ndarray:
+    """Gaussian clusters around random centroids, normalized like OpenAI embeddings."""
+    centroids = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, n_clusters, n)
+    vectors = centroids[labels] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def to_pgvector(vector: np.ndarray) -> str:
+    return "[" + ",".join(f"{x:.6f}" for x in vector) + "]"
+
+
+def load_table(vectors: np.ndarray):
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS dbo.{TABLE}"))
+        conn.execute(text(f"CREATE TABLE dbo.{TABLE} (id integer PRIMARY KEY, embedding vector({DIM}))"))
+
+    # COPY is orders of magnitude faster than row inserts for 100k+ vectors
+    raw = engine.raw_connection()
+    try:
+        buffer = io.StringIO()
+        for i, vector in enumerate(vectors):
+            buffer.write(f"{i}\t{to_pgvector(vector)}\n")
+        buffer.seek(0)
+        raw.cursor().copy_expert(f"COPY dbo.{TABLE} (id, embedding) FROM STDIN", buffer)
+        raw.commit()
+    finally:
+        raw.close()
+
+
+###############################################################################
+# Measurements
+###############################################################################
+
+def run_queries(queries: np.ndarray, k: int, index_type: str = "none", param: int | None = None):
+    sql = text(f"""
+        SELECT id FROM dbo.{TABLE}
+        ORDER BY embedding {DISTANCE_OPERATOR} :q ASC
+        LIMIT :k
+    """)
+    results, latencies = [], []
+
+    with engine.connect() as conn:
+        for query in queries:
+            q = to_pgvector(query)
+            with conn.begin():
+                if index_type == "none":
+                    conn.execute(text("SET LOCAL enable_indexscan = off"))
+                elif index_type == "hnsw":
+                    set_search_params(conn, "hnsw", ef_search=param)
+                else:
+                    set_search_params(conn, "ivfflat", probes=param)
+
+                start = time.perf_counter()
+                ids = conn.execute(sql, {"q": q, "k": k}).scalars().all()
+                latencies.append((time.perf_counter() - start) * 1000)
+            results.append(ids)
+
+    return results, np.array(latencies)
+
+
+def recall_at_k(approx: list[list[int]], exact: list[list[int]]) -> float:
+    return float(np.mean([len(set(a) & set(e)) / len(e) for a, e in zip(approx, exact)]))
+
+
+def summarize(size, index_type, param, recall, latencies, build_s=None):
+    return {
+        "size": size,
+        "index": index_type,
+        "param": param,
+        "recall": round(recall, 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        "build_s": None if build_s is None else round(build_s, 2),
+    }
+
+
+def benchmark(sizes, n_queries, k, ef_search_values, probes_values, index_types, seed):
+    rng = np.random.default_rng(seed)
+    rows = []
+
+    for size in sizes:
+        print(f"\n=== catalog size {size} ===")
+        vectors = synthetic_vectors(size, DIM, n_clusters=max(8, size // 500), rng=rng)
+        # queries are perturbed catalog items, the usual shape of a product search
+        picks = rng.integers(0, size, n_queries)
+        queries = vectors[picks] + 0.3 * rng.standard_normal((n_queries, DIM)).astype(np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+        load_table(vectors)
+        with engine.begin() as conn:
+            create_vector_index(conn, table=TABLE, index_type="none")
+
+        exact, exact_latencies = run_queries(queries, k)
+        rows.append(summarize(size, "exact", None, 1.0, exact_latencies))
+        print(rows[-1])
+
+        for index_type in index_types:
+            start = time.perf_counter()
+            with engine.begin() as conn:
+                create_vector_index(conn, table=TABLE, index_type=index_type)
+            build_s = time.perf_counter() - start
+
+            for param in (ef_search_values if index_type == "hnsw" else probes_values):
+                approx, latencies = run_queries(queries, k, index_type, param)
+                rows.append(summarize(size, index_type, param, recall_at_k(approx, exact), latencies, build_s))
+                print(rows[-1])
+
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS dbo.{TABLE}"))
+
+    return rows
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="pgvector ANN recall/latency benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--index", nargs="+", default=["hnsw", "ivfflat"], choices=["hnsw", "ivfflat"])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[10, 40, 100])
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 10, 30])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    rows = benchmark(args.sizes, args.queries, args.k, args.ef_search, args.probes, args.index, args.seed)
+
+    print(f"\n{'size':>8} {'index':>8} {'param':>6} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8}")
+    for row in rows:
+        print(f"{row['size']:>8} {row['index']:>8} {str(row['param'] or '-'):>6} {row['recall']:>7.3f} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=4)
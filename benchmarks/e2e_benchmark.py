@@ -0,0 +1,167 @@
+"""
+Offline end-to-end benchmark of the recommendation graph.
+
+Runs a fixed query corpus (`benchmarks/queries.jsonl`) through the compiled graph at several
+concurrency levels, with the OpenAI chat and embedding endpoints replaced by the scripted local
+stand-in of `benchmarks/fake_openai.py` (deterministic answers, artificial latency). Everything
+else is real: graph, agents, tools and the local Postgres + pgvector database configured in `.env`,
+so regressions in the graph, tools and DB layer show up without API budget or network access.
+
+Reports throughput, p50/p95/p99 request latency, LLM calls per request and DB time per request.
+
+The database must hold the `01_clean_data` catalog. `--load-data` runs `01_insert_data.py` against
+an empty database first (the product embeddings are stored in `01_clean_data/embeddings`, so no
+embedding request is needed).
+
+Usage:
+    python -m benchmarks.e2e_benchmark --concurrency 1 4 16 --repeat 3
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_openai import FakeOpenAIServer
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "queries.jsonl")
+
+
+###############################################################################
+# Setup
+###############################################################################
+
+def configure_environment(base_url: str):
+    """Points the LLM and embedding clients to the fake endpoints. Must run before importing `main`."""
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAPI_KEY", "benchmark")
+    os.environ.setdefault("OPENAI_TOOL_MODEL", "gpt-4o-mini")
+    os.environ.setdefault("OPENAI_INFER_MODEL", "gpt-4o-mini")
+    os.environ.setdefault("OPENAI_EMB_MODEL", "text-embedding-3-small")
+    # measure the graph itself: no answer reuse, no disk embedding cache, no debug prints
+    os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+    os.environ["EMBEDDING_CACHE_PATH"] = ""
+    os.environ.setdefault("DEBUG_PRINTS", "false")
+
+
+def load_data():
+    subprocess.run([sys.executable, "01_insert_data.py"], check=True, env=os.environ.copy())
+
+
+def read_corpus(path: str) -> list[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line)["query"] for line in f if line.strip()]
+
+
+###############################################################################
+# Measurements
+###############################################################################
+
+async def run_level(queries: list[str], concurrency: int) -> tuple[list[float], int, float]:
+    from main import acall_recommendation_system
+
+    # sync graph nodes run in the default executor under `ainvoke`, size it to the concurrency level
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="graph")
+    )
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(query):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await acall_recommendation_system(query)
+                ok = True
+            except Exception as e:
+                print(f"Query failed: {type(e).__name__}: {e}")
+                ok = False
+            return ok, time.perf_counter() - start
+
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(*(one(q) for q in queries))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for ok, latency in outcomes if ok]
+    return latencies, len(outcomes) - len(latencies), elapsed
+
+
+async def benchmark(server: FakeOpenAIServer, corpus: list[str], concurrency_levels: list[int], repeat: int) -> list[dict]:
+    from main import acall_recommendation_system
+    from agentic_system.utils.tracing import metrics
+
+    # warm-up: imports, graph compilation, connection pools, in-process snapshots
+    # (all levels run on one event loop, async DB connections are bound to it)
+    await acall_recommendation_system(corpus[0])
+
+    queries = corpus * repeat
+    rows = []
+    for concurrency in concurrency_levels:
+        metrics.reset()
+        server.stats.reset()
+
+        latencies, failures, elapsed = await run_level(queries, concurrency)
+
+        summary = metrics.summary()
+        db_ms = sum(s["mean_ms"] * s["count"] for name, s in summary.items() if name.startswith("db:") and "count" in s)
+        llm = server.stats.snapshot()
+        n = len(queries)
+        rows.append({
+            "concurrency": concurrency,
+            "requests": n,
+            "failures": failures,
+            "throughput_rps": round(n / elapsed, 3),
+            "p50_s": round(float(np.percentile(latencies, 50)), 3) if latencies else None,
+            "p95_s": round(float(np.percentile(latencies, 95)), 3) if latencies else None,
+            "p99_s": round(float(np.percentile(latencies, 99)), 3) if latencies else None,
+            "llm_calls_per_request": round(llm["chat_calls_total"] / n, 2),
+            "llm_calls_by_kind": llm["chat_calls"],
+            "embedding_calls_per_request": round(llm["embedding_calls"] / n, 2),
+            "db_ms_per_request": round(db_ms / n, 2),
+            "spans": summary,
+        })
+        print({k: v for k, v in rows[-1].items() if k != "spans"})
+
+    return rows
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the recommendation graph")
+    parser.add_argument("--corpus", default=CORPUS_PATH, help="JSONL file with one {\"query\": ...} per line")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--repeat", type=int, default=3, help="Times the corpus is run at each concurrency level")
+    parser.add_argument("--port", type=int, default=8001, help="Port of the fake OpenAI endpoints")
+    parser.add_argument("--chat-latency-ms", type=float, default=300)
+    parser.add_argument("--token-latency-ms", type=float, default=0)
+    parser.add_argument("--embedding-latency-ms", type=float, default=50)
+    parser.add_argument("--load-data", action="store_true", help="Run 01_insert_data.py first (empty database)")
+    parser.add_argument("--output", default=None, help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    with FakeOpenAIServer(
+        port=args.port,
+        chat_latency_ms=args.chat_latency_ms,
+        token_latency_ms=args.token_latency_ms,
+        embedding_latency_ms=args.embedding_latency_ms,
+    ) as server:
+        configure_environment(server.base_url)
+        if args.load_data:
+            load_data()
+
+        rows = asyncio.run(benchmark(server, read_corpus(args.corpus), args.concurrency, args.repeat))
+
+    print(f"\n{'conc':>5} {'req':>5} {'fail':>5} {'req/s':>7} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} {'llm/req':>8} {'db ms/req':>10}")
+    for row in rows:
+        print(
+            f"{row['concurrency']:>5} {row['requests']:>5} {row['failures']:>5} {row['throughput_rps']:>7.2f} "
+            f"{row['p50_s'] or 0:>7.3f} {row['p95_s'] or 0:>7.3f} {row['p99_s'] or 0:>7.3f} "
+            f"{row['llm_calls_per_request']:>8.2f} {row['db_ms_per_request']:>10.2f}"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=4)
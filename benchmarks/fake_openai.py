@@ -0,0 +1,300 @@
+"""
+Local stand-in for the OpenAI chat completions and embeddings endpoints.
+
+Answers are scripted and deterministic, following the recommendation graph:
+
+- supervisor (structured `Router` output): querying_node -> recommendation_specialist_node -> FINISH,
+  FINISH right away for requests containing an out-of-scope keyword
+- querying agent (functions agent or parallel planner): one `product_search_tool` call with the
+  user request, then the tool result is returned as the {"products", "cooccurrences"} payload
+- recommendation agent: one `recommendation_engine_tool` call with the queried data, then the tool result
+- plain completions (recommendation text, refusal): a fixed answer of `--answer-tokens` words
+- embeddings: unit-normalized pseudo-random vectors seeded by the text, so equal texts get equal vectors
+
+Every request waits an artificial latency (`--chat-latency-ms` + `--token-latency-ms` per output token,
+`--embedding-latency-ms`), so the graph sees a realistic amount of time spent in the model.
+
+Usage:
+    python -m benchmarks.fake_openai --port 8001
+    # then point the recommendation system to it
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 python main.py "<your user query>"
+"""
+import re
+import ast
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import threading
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+DIM = 1536
+OUT_OF_SCOPE_KEYWORDS = ("pizza", "weather", "recipe", "stock", "bitcoin", "poem")
+
+# the querying agent renders its prompt (user query and scratchpad) as a single text message
+USER_QUERY_PATTERN = re.compile(r"User query:\s*\n\s*(.*?)\n\s*\n", re.S)
+FUNCTION_RESULT_PATTERN = re.compile(r"FunctionMessage\(content=('(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\")")
+
+
+###############################################################################
+# Scripted responses
+###############################################################################
+
+def _text(content) -> str:
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content or ""
+
+
+def _user_query(messages: list[dict]) -> str:
+    for message in messages:
+        if message["role"] == "user":
+            content = _text(message.get("content"))
+            match = USER_QUERY_PATTERN.search(content)
+            return match.group(1).strip() if match else content
+    return ""
+
+
+def _tool_names(body: dict) -> list[str]:
+    names = [t["function"]["name"] for t in body.get("tools") or []]
+    names += [f["name"] for f in body.get("functions") or []]
+    return names
+
+
+def _tool_result(messages: list[dict]) -> str | None:
+    """Content of the last tool/function result, if the model already called a tool."""
+    for message in reversed(messages):
+        if message["role"] in ("tool", "function"):
+            return _text(message.get("content"))
+        match = FUNCTION_RESULT_PATTERN.search(_text(message.get("content")))
+        if match:
+            return ast.literal_eval(match.group(1))
+    return None
+
+
+def supervisor_decision(messages: list[dict]) -> str:
+    names = {message.get("name") for message in messages}
+    if "recommendation_specialist_node" in names:
+        return "FINISH"
+    if "querying_node" in names:
+        return "recommendation_specialist_node"
+    if any(keyword in _user_query(messages).lower() for keyword in OUT_OF_SCOPE_KEYWORDS):
+        return "FINISH"
+    return "querying_node"
+
+
+def scripted_reply(body: dict, answer_tokens: int) -> tuple[str, dict]:
+    """Returns (kind, message) where message holds `content` and/or a single tool/function call."""
+    messages = body["messages"]
+    tools = _tool_names(body)
+    response_format = body.get("response_format") or {}
+
+    if "Router" in tools or response_format.get("json_schema", {}).get("name") == "Router":
+        arguments = json.dumps({"next": supervisor_decision(messages)})
+        if "Router" in tools:
+            return "supervisor", {"tool": "Router", "arguments": arguments}
+        return "supervisor", {"content": arguments}
+
+    result = _tool_result(messages)
+    query = _user_query(messages)
+
+    if "product_search_tool" in tools:
+        if result is None:
+            arguments = json.dumps({"query": query, "limit": 10})
+            return "querying", {"tool": "product_search_tool", "arguments": arguments, "legacy": "functions" in body}
+        try:
+            products = json.loads(result)
+        except json.JSONDecodeError:
+            products = []
+        return "querying", {"content": json.dumps({"products": products, "cooccurrences": []}, ensure_ascii=False)}
+
+    if "recommendation_engine_tool" in tools:
+        if result is None:
+            queried = next((_text(m.get("content")) for m in messages if m.get("name") == "querying_node"), "")
+            arguments = json.dumps({
+                "query": query,
+                "queried_info": [{"products_query_output": [queried], "coocurrences_query_output": []}],
+            })
+            return "recommendation_agent", {"tool": "recommendation_engine_tool", "arguments": arguments}
+        # the tool answer is the recommendation, a failed tool call is answered by the agent itself
+        return "recommendation_agent", {"content": result if not result.startswith("Error") else answer(answer_tokens)}
+
+    return "completion", {"content": answer(answer_tokens)}
+
+
+def answer(n_tokens: int) -> str:
+    words = ["Based", "on", "the", "queried", "data,", "I", "recommend"]
+    return " ".join((words * (n_tokens // len(words) + 1))[:n_tokens])
+
+
+def fake_embedding(text: str) -> list[float]:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(DIM).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+###############################################################################
+# Server
+###############################################################################
+
+class FakeOpenAIStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.chat_calls = {}
+            self.embedding_calls = 0
+            self.embedded_texts = 0
+
+    def chat(self, kind: str):
+        with self._lock:
+            self.chat_calls[kind] = self.chat_calls.get(kind, 0) + 1
+
+    def embeddings(self, n_texts: int):
+        with self._lock:
+            self.embedding_calls += 1
+            self.embedded_texts += n_texts
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "chat_calls": dict(self.chat_calls),
+                "chat_calls_total": sum(self.chat_calls.values()),
+                "embedding_calls": self.embedding_calls,
+                "embedded_texts": self.embedded_texts,
+            }
+
+
+def _chat_message(reply: dict) -> dict:
+    message = {"role": "assistant", "content": reply.get("content")}
+    if "tool" in reply and reply.get("legacy"):
+        message["function_call"] = {"name": reply["tool"], "arguments": reply["arguments"]}
+    elif "tool" in reply:
+        message["tool_calls"] = [{
+            "id": f"call_{hashlib.md5(reply['arguments'].encode()).hexdigest()[:12]}",
+            "type": "function",
+            "function": {"name": reply["tool"], "arguments": reply["arguments"]},
+        }]
+    return message
+
+
+def create_app(chat_latency_ms: float = 300, token_latency_ms: float = 0, embedding_latency_ms: float = 50,
+               answer_tokens: int = 120) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI")
+    app.state.stats = FakeOpenAIStats()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        kind, reply = scripted_reply(body, answer_tokens)
+        app.state.stats.chat(kind)
+
+        message = _chat_message(reply)
+        output = (message.get("content") or "") + reply.get("arguments", "")
+        prompt_tokens = sum(estimate_tokens(_text(m.get("content"))) + 4 for m in body["messages"])
+        completion_tokens = estimate_tokens(output)
+        finish_reason = "function_call" if "function_call" in message else "tool_calls" if "tool_calls" in message else "stop"
+
+        await asyncio.sleep((chat_latency_ms + token_latency_ms * completion_tokens) / 1000)
+
+        created = int(time.time())
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        if not body.get("stream"):
+            return JSONResponse({
+                "id": "chatcmpl-fake", "object": "chat.completion", "created": created, "model": body["model"],
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": usage,
+            })
+
+        # streamed: the whole message in one delta, then the finish chunk
+        if "tool_calls" in message:
+            message["tool_calls"][0]["index"] = 0
+
+        def chunk(delta, finish=None, with_usage=False):
+            data = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created, "model": body["model"],
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+            if with_usage:
+                data["usage"] = usage
+            return f"data: {json.dumps(data)}\n\n"
+
+        async def events():
+            yield chunk(message)
+            yield chunk({}, finish_reason, with_usage=True)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        app.state.stats.embeddings(len(texts))
+
+        await asyncio.sleep(embedding_latency_ms / 1000)
+
+        tokens = sum(estimate_tokens(t) for t in texts)
+        return JSONResponse({
+            "object": "list",
+            "model": body["model"],
+            "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(t)} for i, t in enumerate(texts)],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    @app.get("/stats")
+    async def stats():
+        return app.state.stats.snapshot()
+
+    return app
+
+
+class FakeOpenAIServer:
+    """Runs the fake endpoints in a background thread (`with FakeOpenAIServer(...) as server:`)."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8001, **app_kwargs):
+        self.app = create_app(**app_kwargs)
+        self.server = uvicorn.Server(uvicorn.Config(self.app, host=host, port=port, log_level="warning"))
+        self.base_url = f"http://{host}:{port}/v1"
+        self._thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def stats(self) -> FakeOpenAIStats:
+        return self.app.state.stats
+
+    def __enter__(self):
+        self._thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self._thread.join()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI chat and embeddings endpoints")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--chat-latency-ms", type=float, default=300)
+    parser.add_argument("--token-latency-ms", type=float, default=0)
+    parser.add_argument("--embedding-latency-ms", type=float, default=50)
+    parser.add_argument("--answer-tokens", type=int, default=120)
+    args = parser.parse_args()
+
+    uvicorn.run(
+        create_app(args.chat_latency_ms, args.token_latency_ms, args.embedding_latency_ms, args.answer_tokens),
+        host=args.host,
+        port=args.port,
+    )
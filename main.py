@@ -1,9 +1,16 @@
 import sys
+import asyncio
+import argparse
+from functools import lru_cache
 from dotenv import load_dotenv
+from langchain_core.messages import RemoveMessage
 from langgraph.graph import StateGraph, START
 
-from agentic_system.utils.utils import SimpleState
-from agentic_system.agents.querying_agent import querying_node
+from agentic_system.utils.utils import SimpleState, USER_FACING_TAG
+from agentic_system.utils.response_cache import response_cache, RESPONSE_CACHE_ENABLED
+from agentic_system.utils.tracing import tracing_callback, set_debug_prints, debug_print
+from agentic_system.utils.checkpoints import get_checkpointer
+from agentic_system.agents.querying_agent import querying_runnable, agent_executor
 from agentic_system.agents.recommendation_agent import recommendation_specialist_node
 from agentic_system.agents.supervisor_agent import recommendation_supervisor_node
 
@@ -13,51 +20,180 @@ from agentic_system.agents.supervisor_agent import recommendation_supervisor_nod
 # Recommendation System Builder (Graph)
 ###############################################################################
 
-def system_builder_graph():
+def system_builder_graph(checkpointer=None):
     system_builder = StateGraph(SimpleState)
     system_builder.add_edge(START, "recommendation_supervisor_node")
     system_builder.add_node("recommendation_supervisor_node", recommendation_supervisor_node)
-    system_builder.add_node("querying_node", querying_node)
+    system_builder.add_node("querying_node", querying_runnable)
     system_builder.add_node("recommendation_specialist_node", recommendation_specialist_node)
 
-    system_builder_graph = system_builder.compile()
+    system_builder_graph = system_builder.compile(checkpointer=checkpointer)
 
     #print(system_builder_graph.get_graph().draw_ascii())
 
     return system_builder_graph 
 
 
+@lru_cache(maxsize=1)
+def get_recommendation_graph():
+    """Compiles the recommendation graph once per process and reuses it afterwards.
+
+    The compiled graph is stateless between invocations (no checkpointer at graph level),
+    so the same instance can safely serve many concurrent `invoke`/`ainvoke` calls.
+    The tracing callback is attached here, so every node, tool and LLM call of a run is timed.
+    """
+    return system_builder_graph().with_config(callbacks=[tracing_callback])
+
+
+@lru_cache(maxsize=1)
+def get_conversation_graph():
+    """Same graph, checkpointed per session (thread_id) in the bounded conversation store.
+
+    Each turn of a session continues from the messages of the previous turns, older turns are
+    dropped beyond `MESSAGE_TOKEN_CAP` and idle sessions are evicted (see `utils/checkpoints.py`).
+    """
+    return system_builder_graph(checkpointer=get_checkpointer()).with_config(callbacks=[tracing_callback])
+
+
+def _graph_for(session_id: str | None):
+    """Graph and run config of a request: stateless, or continuing the session `session_id`."""
+    if session_id is None:
+        return get_recommendation_graph(), None
+    return get_conversation_graph(), {"configurable": {"thread_id": session_id}}
+
+
 ###############################################################################
 # Call Agent
 ###############################################################################
  
-def call_recommendation_system(user_query):
+def call_recommendation_system(user_query, session_id=None):
 
     # user_query ="I want to know how many zelda games are because I want to start a collection"
 
+    # near-duplicate questions are answered from the semantic response cache
+    # (not in sessions: the answer depends on the previous turns)
+    use_cache = RESPONSE_CACHE_ENABLED and session_id is None
+    if use_cache:
+        cached_msg, query_embedding, cache_version = response_cache.lookup(user_query)
+        if cached_msg is not None:
+            return cached_msg
+
     inputs = {"messages": [("user", f"{user_query}")]}
 
-    sbg_instance = system_builder_graph()
-    graph_output = sbg_instance.invoke(inputs)
+    sbg_instance, config = _graph_for(session_id)
+    graph_output = sbg_instance.invoke(inputs, config)
 
     #print ("DONE")
 
     final_msg = graph_output["messages"][-1] 
 
+    if use_cache:
+        response_cache.store(query_embedding, final_msg, cache_version)
+
     #print(f"FINAL MESSAGE: \n {final_msg.content}")
     return final_msg
 
 
+async def acall_recommendation_system(user_query, session_id=None):
+    """Async counterpart of `call_recommendation_system`, used by the long-lived server."""
+
+    # embedding and catalog version lookups are blocking, keep them off the event loop
+    use_cache = RESPONSE_CACHE_ENABLED and session_id is None
+    if use_cache:
+        cached_msg, query_embedding, cache_version = await asyncio.to_thread(response_cache.lookup, user_query)
+        if cached_msg is not None:
+            return cached_msg
+
+    inputs = {"messages": [("user", f"{user_query}")]}
+
+    graph, config = _graph_for(session_id)
+    graph_output = await graph.ainvoke(inputs, config)
+    final_msg = graph_output["messages"][-1]
+
+    if use_cache:
+        await asyncio.to_thread(response_cache.store, query_embedding, final_msg, cache_version)
+
+    return final_msg
+
+
+async def astream_recommendation_system(user_query, session_id=None):
+    """Streams a recommendation as events, as soon as they are produced.
+
+    Yields dicts:
+    - {"type": "progress", "message": ...}  node/tool progress ("Searching catalog...")
+    - {"type": "token", "content": ...}     tokens of the user-facing LLM calls
+    - {"type": "final", "content": ...}     the final message, once the graph is done
+    """
+    use_cache = RESPONSE_CACHE_ENABLED and session_id is None
+    if use_cache:
+        cached_msg, query_embedding, cache_version = await asyncio.to_thread(response_cache.lookup, user_query)
+        if cached_msg is not None:
+            yield {"type": "final", "content": cached_msg.content}
+            return
+
+    inputs = {"messages": [("user", f"{user_query}")]}
+
+    graph, config = _graph_for(session_id)
+    final_msg = None
+    # subgraphs: the user-facing tokens are produced inside the recommendation agent (a subgraph),
+    # whose final answer is the tool output itself (return_direct), so tokens and final text match
+    async for namespace, mode, chunk in graph.astream(inputs, config, stream_mode=["messages", "custom", "updates"], subgraphs=True):
+        if mode == "custom":
+            yield chunk
+        elif mode == "messages":
+            message_chunk, metadata = chunk
+            if USER_FACING_TAG in metadata.get("tags", []) and message_chunk.content:
+                yield {"type": "token", "content": message_chunk.content}
+        elif mode == "updates" and not namespace:
+            for update in chunk.values():
+                if update and update.get("messages") and not isinstance(update["messages"][-1], RemoveMessage):
+                    final_msg = update["messages"][-1]
+
+    if use_cache and final_msg is not None:
+        await asyncio.to_thread(response_cache.store, query_embedding, final_msg, cache_version)
+
+    yield {"type": "final", "content": final_msg.content if final_msg is not None else ""}
+
+
+async def print_stream(user_query):
+    streamed_tokens = False
+    async for event in astream_recommendation_system(user_query):
+        if event["type"] == "progress":
+            print(f"\n[{event['message']}]", flush=True)
+        elif event["type"] == "token":
+            if not streamed_tokens:
+                print("\nAnswer: ", end="", flush=True)
+                streamed_tokens = True
+            print(event["content"], end="", flush=True)
+        elif event["type"] == "final" and not streamed_tokens:
+            print(f"\nAnswer: {event['content']}")
+    print()
+
+
 if __name__ == "__main__":
 
-    user_query = sys.argv[1]
+    parser = argparse.ArgumentParser(description="Nintendo Switch recommendation system")
+    parser.add_argument("user_query")
+    parser.add_argument("--stream", action="store_true", help="Stream progress and answer tokens as they arrive")
+    parser.add_argument("--debug", action="store_true", help="Print the agents' debug output (state dumps, query results)")
+    args = parser.parse_args()
+
+    if args.debug:
+        set_debug_prints(True)
+        agent_executor.verbose = True
+
+    user_query = args.user_query
     
     print(f"User query received: {user_query}")
-    print("\n\n--------------------------------debug prints--------------------------------\n")
+    debug_print("\n\n--------------------------------debug prints--------------------------------\n")
+
+    if args.stream:
+        asyncio.run(print_stream(user_query))
+        sys.exit(0)
 
     answer = call_recommendation_system(user_query)
     
-    print("\n\n--------------------------------ended debug prints--------------------------------\n")
+    debug_print("\n\n--------------------------------ended debug prints--------------------------------\n")
     print(f"Answer: {answer.content}")
 
     # user_query = "I want a pepperoni pizza with extra cheese please."
@@ -0,0 +1,167 @@
+import os
+import json
+import asyncio
+import argparse
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from pydantic import BaseModel
+from dotenv import load_dotenv
+
+from main import get_recommendation_graph, get_conversation_graph, acall_recommendation_system, astream_recommendation_system
+from agentic_system.agents.pre_router import pre_router, PRE_ROUTER_ENABLED
+from agentic_system.utils.response_cache import response_cache, RESPONSE_CACHE_ENABLED
+from agentic_system.utils.payload import prompt_token_stats
+from agentic_system.utils.tracing import metrics
+from agentic_system.utils.checkpoints import get_checkpointer
+from agentic_system.db.catalog_snapshot import catalog_snapshot
+
+load_dotenv()
+
+
+###############################################################################
+# Serving configuration
+###############################################################################
+
+# max number of graph executions running at the same time
+MAX_CONCURRENCY = int(os.environ.get("SERVER_MAX_CONCURRENCY", 8))
+# max number of requests waiting for a free slot before the server starts rejecting (backpressure)
+MAX_QUEUE = int(os.environ.get("SERVER_MAX_QUEUE", 32))
+
+
+class ConcurrencyLimiter:
+    """Bounds in-flight graph executions and rejects requests once the waiting queue is full."""
+
+    def __init__(self, max_concurrency: int, max_queue: int):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+
+    def is_saturated(self) -> bool:
+        return self.waiting >= self.max_queue
+
+    @asynccontextmanager
+    async def slot(self):
+        if self.is_saturated():
+            raise HTTPException(
+                status_code=503,
+                detail="Server is at capacity, please retry later.",
+                headers={"Retry-After": "1"},
+            )
+
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+
+###############################################################################
+# App
+###############################################################################
+
+class RecommendationRequest(BaseModel):
+    query: str
+    # optional: turns sent with the same session_id continue the same conversation
+    session_id: str | None = None
+
+
+class RecommendationResponse(BaseModel):
+    answer: str
+
+
+def create_app(max_concurrency: int = MAX_CONCURRENCY, max_queue: int = MAX_QUEUE) -> FastAPI:
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # sync graph nodes run in the loop's default executor under `ainvoke`,
+        # size it to the concurrency limit so it never becomes the hidden bottleneck
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="graph")
+        )
+
+        # compile the graph once at startup, every request reuses the same instance
+        get_recommendation_graph()
+        get_conversation_graph()
+        # product names, IDs and details are served from memory, load them before the first request
+        catalog_snapshot.get()
+        app.state.limiter = ConcurrencyLimiter(max_concurrency, max_queue)
+        print(f"Recommendation graph compiled (max_concurrency={max_concurrency}, max_queue={max_queue})")
+        yield
+
+    app = FastAPI(title="Nintendo Switch Recommendation System", lifespan=lifespan)
+
+    @app.get("/health")
+    async def health():
+        limiter = app.state.limiter
+        return {
+            "status": "ok",
+            "in_flight": limiter.in_flight,
+            "waiting": limiter.waiting,
+            "max_concurrency": limiter.max_concurrency,
+            "max_queue": limiter.max_queue,
+            "pre_router": pre_router.stats() if PRE_ROUTER_ENABLED else None,
+            "response_cache": response_cache.stats() if RESPONSE_CACHE_ENABLED else None,
+            "conversations": get_checkpointer().stats(),
+            "prompt_tokens": prompt_token_stats(),
+            "latency": metrics.summary(),
+        }
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def prometheus_metrics():
+        """Node, tool, LLM, embedding and DB latency histograms in Prometheus text format."""
+        return metrics.to_prometheus()
+
+    @app.post("/recommend", response_model=RecommendationResponse)
+    async def recommend(request: RecommendationRequest):
+        async with app.state.limiter.slot():
+            answer = await acall_recommendation_system(request.query, request.session_id)
+        return RecommendationResponse(answer=answer.content)
+
+    @app.post("/recommend/stream")
+    async def recommend_stream(request: RecommendationRequest):
+        """Server-sent events: progress, token and final events (see `astream_recommendation_system`)."""
+        limiter = app.state.limiter
+        if limiter.is_saturated():
+            raise HTTPException(status_code=503, detail="Server is at capacity, please retry later.", headers={"Retry-After": "1"})
+
+        async def events():
+            # the slot is held for the whole stream
+            async with limiter.slot():
+                async for event in astream_recommendation_system(request.query, request.session_id):
+                    yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Long-lived recommendation system server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--uds", default=None, help="Bind to a unix domain socket instead of host/port")
+    parser.add_argument("--max-concurrency", type=int, default=MAX_CONCURRENCY)
+    parser.add_argument("--max-queue", type=int, default=MAX_QUEUE)
+    args = parser.parse_args()
+
+    uvicorn.run(
+        create_app(args.max_concurrency, args.max_queue),
+        host=args.host,
+        port=args.port,
+        uds=args.uds,
+        workers=1,  # a single process owns the compiled graph, concurrency happens inside it
+    )